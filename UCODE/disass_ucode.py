@@ -36,15 +36,19 @@
 
 '''
 
-import os
+import argparse
 import importlib
+import multiprocessing
+import os
+import shutil
 
 from pyreveng import mem, assy, data, listing
 
-import r1k_ucode_explain
 import macro_disass
 
 import r1k_ucode
+import r1k_ucode_listing
+import r1k_ucode_instrument as instrument
 
 R1K_UCODE = '''
 A       a       | uadr			    |
@@ -78,68 +82,136 @@ class R1kUcode(assy.Instree_disass):
 def r1k_microcode(fn=None):
     ''' Disassemble an ucode file '''
     cx = R1kUcode()
-    cx.ucode = r1k_ucode.Ucode(source=fn)
-    for u in reversed(cx.ucode):
-        if not u.explainer.isdefault(u):
-            break
-    m = mem.WordMem(0x100, u.adr + 2, bits=14)
+    with instrument.span("ucode"):
+        cx.ucode = r1k_ucode.Ucode(source=fn, cache=True)
+    with instrument.span("index"):
+        occ = cx.ucode.occupancy()
+        cx.ucode.cfg()
+    m = mem.WordMem(0x100, occ.end() + 1, bits=14)
     cx.m = m
 
     detail_module = "details_" + cx.ucode.hash[:6]
-    try:
-        details = importlib.import_module(detail_module)
-        details.Details(cx)
-    except ModuleNotFoundError as err:
-        cx.m.set_block_comment(cx.m.lo, "  no " + detail_module)
+    with instrument.span("details"):
+        try:
+            details = importlib.import_module(detail_module)
+            details.Details(cx)
+        except ModuleNotFoundError as err:
+            cx.m.set_block_comment(cx.m.lo, "  no " + detail_module)
 
     print("CX", cx, "CX.M", cx.m)
 
-    for n, uins in enumerate(cx.ucode):
-        adr = n + 0x100
-        if adr >= m.hi:
-            break
+    # The flow may still wander into <default> words, so define them all
+    for adr in range(m.lo, m.hi):
         m[adr] = adr
-        j = set()
-        for i in uins.macro_ins:
-            x = macro_disass.disassemble(i)
-            if "QQ" in x:
+
+    with instrument.span("macro_disass"):
+        macro_text = dict(macro_disass.disassemble_many(sorted(set(cx.ucode.macro_values))))
+
+    with instrument.span("annotate"):
+        for lo, hi, kind in occ:
+            lo = max(lo, m.lo)
+            hi = min(hi, m.hi)
+            if lo >= hi:
                 continue
-            if x not in j:
-                cx.m.set_block_comment(adr, "0x%04x " % i + x)
-                j.add(x)
-            cx.m.set_label(adr, "MACRO_%04x" % i)
-
-    cx.disass(0x100)
-    explain = r1k_ucode_explain.Explain()
-    cx.m.set_block_comment(0x100, "Defaults not shown:")
-    cx.m.set_block_comment(0x100, "===================")
-    for i in explain.defaults_text():
-        cx.m.set_block_comment(0x100, " " * 4 + i)
-
-    cx.m.set_block_comment(0x100, " ")
-
-    for i, j in (
-        ("Early macro", explain.early_macro_events),
-        ("Late macro", explain.late_macro_events),
-        ("Micro", explain.micro_events),
-    ):
-        for x, y in j.items():
-            cx.m.set_block_comment(x, i + " event: " + y)
-            cx.m.set_label(x, y)
+            if kind == occ.DEFAULT and hi - lo > 1:
+                cx.m.set_block_comment(lo, "0x%04x-0x%04x <default>" % (lo, hi - 1))
+            for adr in range(lo, hi):
+                comments, labels = r1k_ucode_listing.annotations(
+                    cx.ucode, adr, macro_text.get, kind != occ.DEFAULT
+                )
+                for i in comments:
+                    cx.m.set_block_comment(adr, i)
+                for i in labels:
+                    cx.m.set_label(adr, i)
+
+    with instrument.span("disass"):
+        cx.disass(0x100)
 
     return cx
 
 #######################################################################
 
-if __name__ == '__main__':
-    import sys
-
-    import glob
+def disass_file(job):
+    '''
+       Disassemble one file to a listing, in a worker
+
+       With `profile` the instrumentation report is written next to
+       the listing, as <listing>.json
+    '''
+    fn, path, profile = job
+    if profile:
+        instrument.enable()
+    with instrument.span("total"):
+        cx = r1k_microcode(fn)
+        with instrument.span("listing"):
+            listing.Listing(cx.m, fn=path, ncol=1, charset=False)
+    if profile:
+        instrument.write_report(path + ".json")
+        instrument.disable()
+    return path
+
+def batch(jobs, nproc=None, profile=False):
+    '''
+       Disassemble (file, listing path) `jobs` in a pool of `nproc` workers
+
+       Files are deduplicated by their hash, duplicates get a copy of
+       the listing.  The macro instructions of all files are
+       disassembled into the macro_disass cache before the pool is
+       started, so the workers only read it.  Each worker keeps its
+       explain cache from file to file.
+    '''
+    uniq = {}
+    opcodes = set()
+    for fn, path in jobs:
+        ucode = r1k_ucode.Ucode(source=fn, cache=True)
+        if ucode.hash not in uniq:
+            uniq[ucode.hash] = []
+            ucode.decode("dispatch")
+            opcodes.update(ucode.macro_values)
+        uniq[ucode.hash].append((fn, path))
+
+    list(macro_disass.disassemble_many(sorted(opcodes)))
+    macro_disass.flush_cache()
+
+    work = [i[0] + (profile,) for i in uniq.values()]
+    if nproc == 1 or len(work) == 1:
+        done = [disass_file(i) for i in work]
+    else:
+        with multiprocessing.Pool(nproc) as pool:
+            done = pool.map(disass_file, work)
+
+    for path, dups in zip(done, uniq.values()):
+        for fn, dup in dups[1:]:
+            shutil.copyfile(path, dup)
+            if profile:
+                shutil.copyfile(path + ".json", dup + ".json")
+
+def main():
+    ''' ... '''
+    parser = argparse.ArgumentParser(description="Disassemble R1000 microcode")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: all cores)")
+    parser.add_argument(
+        "-o", "--output-dir",
+        help="write a listing per file, named after it, here (default: one file to /tmp/_ucode)",
+    )
+    parser.add_argument("--profile", action="store_true", help="write <listing>.json with timing and memory use")
+    parser.add_argument("source", nargs="+")
+    args = parser.parse_args()
+
+    if args.output_dir is None:
+        if len(args.source) > 1:
+            parser.error("several files need --output-dir")
+        jobs = [(args.source[0], "/tmp/_ucode")]
+    else:
+        listings = {}
+        for fn in args.source:
+            path = os.path.join(args.output_dir, os.path.basename(fn) + ".lst")
+            other = listings.setdefault(path, fn)
+            if os.path.realpath(other) != os.path.realpath(fn):
+                parser.error("%s and %s would both be listed in %s" % (other, fn, path))
+        os.makedirs(args.output_dir, exist_ok=True)
+        jobs = [(fn, path) for path, fn in listings.items()]
+    batch(jobs, args.jobs, args.profile)
 
-    #if len(sys.argv) == 5 and sys.argv[1] == "-AutoArchaeologist":
-    #    cx = r1k_experiment(sys.argv[3], sys.argv[2])
-    #    listing.Listing(cx.m, fn=sys.argv[4], ncol=1)
-    #    exit(0)
-
-    cx = r1k_microcode(sys.argv[1])
-    listing.Listing(cx.m, fn="/tmp/_ucode", ncol=1, charset=False)
+if __name__ == '__main__':
+    main()
@@ -2,46 +2,262 @@
    Enlist PyReveng3 to disassemble a macro instruction
 '''
 
+import argparse
+import array
+import atexit
+import fcntl
+import mmap
+import multiprocessing
+import os
+import sys
+
 from pyreveng import mem
 import pyreveng.cpu.r1000 as r1000
 
+import r1k_ucode_instrument as instrument
+
 CACHE_FILE = "_pyreveng3_cache.txt"
 pyreveng3_cache = {}
 
+# Entries not yet in CACHE_FILE, written FLUSH_EVERY at a time and at exit
+FLUSH_EVERY = 256
+pending = {}
+
+# How far into CACHE_FILE we have read, and the entries found there
+cache_pos = None
+on_disk = set()
+
+# Disassembly of all 64K macro instructions, see build_table()
+TABLE_FILE = "_pyreveng3_table.bin"
+TABLE_MAGIC = b"R1kMacro"
+NOPCODE = 1 << 16
+pyreveng3_table = None
+
+def merge_cache(fi):
+    ''' Merge the entries in CACHE_FILE we have not seen yet '''
+    global cache_pos
+    fi.seek(cache_pos or 0)
+    while True:
+        i = fi.readline()
+        if i[-1:] != '\n':
+            # Being written by somebody else, pick it up next time
+            break
+        cache_pos = fi.tell()
+        j = i[:-1].split('\x01')
+        try:
+            ins = int(j[0], 16)
+            pyreveng3_cache.setdefault(ins, j[1])
+        except (ValueError, IndexError):
+            continue
+        on_disk.add(ins)
+    if cache_pos is None:
+        cache_pos = 0
+
 def read_cache():
-    ''' Read the cache file if there is one '''
+    ''' (Re)read the cache file if there is one '''
+    global cache_pos
     try:
         fi = open(CACHE_FILE)
     except FileNotFoundError:
+        # Nothing to read, until we write it ourselves
+        cache_pos = 0
+        return
+    with fi:
+        fcntl.flock(fi, fcntl.LOCK_SH)
+        merge_cache(fi)
+        fcntl.flock(fi, fcntl.LOCK_UN)
+
+def flush_cache():
+    ''' Append the pending entries to the cache file, in one locked write '''
+    if not pending:
         return
-    for i in fi:
-        j = i.split('\x01')
-        pyreveng3_cache[int(j[0], 16)] = j[1]
-    fi.close()
+    with open(CACHE_FILE, "a+") as fo:
+        fcntl.flock(fo, fcntl.LOCK_EX)
+        merge_cache(fo)
+        fo.write("".join(
+            "0x%x" % ins + '\x01' + txt + '\n'
+            for ins, txt in pending.items() if ins not in on_disk
+        ))
+        fo.flush()
+        merge_cache(fo)
+        fcntl.flock(fo, fcntl.LOCK_UN)
+    pending.clear()
 
 def add_to_cache(ins, txt):
-    ''' Add entry to cache file '''
-    fo = open(CACHE_FILE, "a")
-    fo.write("0x%x" % ins + '\x01' + txt + '\n')
-    fo.close()
+    ''' Add entry to cache, the file is written behind '''
+    pyreveng3_cache[ins] = txt
+    pending[ins] = txt
+    if len(pending) >= FLUSH_EVERY:
+        flush_cache()
+
+atexit.register(flush_cache)
+
+class Disassembler():
+    '''
+       Disassemble any number of macro instructions with PyReveng3
+
+       Each instruction gets a new r1000 cpu and scratch memory, as
+       it always did.  With `shared`, one cpu, with its instruction
+       tree, is kept for all of them instead.  That is faster, but
+       only right if the cpu carries nothing over from one instruction
+       to the next, which verify() (`--verify`) checks.
+    '''
+
+    def __init__(self, shared=False):
+        self.cpu = None
+        if shared:
+            self.cpu = r1000.r1000()
+
+    def render(self, ins):
+        ''' Disassemble a macro instruction, None if it cannot be '''
+        ram = mem.WordMem(0, 0x10, bits=16)
+        ram[0] = ins
+        ram[1] = 2
+        ram[2] = 0
+        ram[3] = 0
+        cpu = self.cpu
+        if cpu is None:
+            cpu = r1000.r1000()
+        cpu.m = ram
+        cpu.disass(0)
+        for i in ram:
+            return i.render()
+        return None
+
+engine = None
+
+def render(ins):
+    ''' Disassemble a macro instruction with PyReveng3, None if it cannot '''
+    global engine
+    if engine is None:
+        engine = Disassembler()
+    return engine.render(ins)
+
+def verify(opcodes):
+    '''
+       Yield (ins, shared, fresh) for each of `opcodes` which a shared
+       cpu `Disassembler` renders differently than a new cpu, or
+       differently than CACHE_FILE has it (`fresh` is then the cached
+       text).
+    '''
+    if cache_pos is None:
+        read_cache()
+    engine_shared = Disassembler(shared=True)
+    engine_fresh = Disassembler()
+    for ins in opcodes:
+        shared = engine_shared.render(ins)
+        fresh = engine_fresh.render(ins)
+        if shared != fresh:
+            yield ins, shared, fresh
+        elif ins in on_disk and pyreveng3_cache[ins] != shared:
+            yield ins, shared, pyreveng3_cache[ins]
+
+def render_range(span):
+    ''' Disassembly of the macro instructions in [lo, hi) '''
+    lo, hi = span
+    retval = []
+    for ins in range(lo, hi):
+        txt = render(ins)
+        if txt is None:
+            txt = "PyReveng3 could not disassemble 0x%04x" % ins
+        retval.append(txt)
+    return retval
+
+def build_table(nproc=None, chunk=1024):
+    '''
+       Disassemble all 64K macro instructions in a pool of `nproc`
+       processes and write TABLE_FILE:
+
+           TABLE_MAGIC
+           NOPCODE + 1 little-endian 32 bit offsets into the text
+           the UTF-8 texts, back to back
+    '''
+    with multiprocessing.Pool(nproc) as pool:
+        texts = []
+        for i in pool.imap(render_range, [(lo, lo + chunk) for lo in range(0, NOPCODE, chunk)]):
+            texts += i
+    blob = [i.encode("utf-8") for i in texts]
+    offsets = [0]
+    for i in blob:
+        offsets.append(offsets[-1] + len(i))
+    tmp = TABLE_FILE + ".%d" % os.getpid()
+    with open(tmp, "wb") as fo:
+        fo.write(TABLE_MAGIC)
+        fo.write(b''.join(i.to_bytes(4, "little") for i in offsets))
+        fo.write(b''.join(blob))
+    os.replace(tmp, TABLE_FILE)
+
+def read_table():
+    ''' Map TABLE_FILE if there is one '''
+    global pyreveng3_table
+    pyreveng3_table = False
+    try:
+        fi = open(TABLE_FILE, "rb")
+    except FileNotFoundError:
+        return
+    with fi:
+        view = memoryview(mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ))
+    if view[:len(TABLE_MAGIC)] != TABLE_MAGIC:
+        return
+    offsets = view[len(TABLE_MAGIC):len(TABLE_MAGIC) + 4 * (NOPCODE + 1)].cast("I")
+    if sys.byteorder == "big":
+        offsets = array.array("I", offsets)
+        offsets.byteswap()
+    pyreveng3_table = (offsets, view[len(TABLE_MAGIC) + 4 * (NOPCODE + 1):])
 
 def disassemble(ins):
     ''' Disassemble a macro instruction to a text-string '''
-    if not pyreveng3_cache:
+    if pyreveng3_table is None:
+        read_table()
+    if pyreveng3_table:
+        instrument.count("macro_disass_table_hits")
+        offsets, blob = pyreveng3_table
+        return str(blob[offsets[ins]:offsets[ins + 1]], "utf-8")
+    if cache_pos is None:
         read_cache()
     i = pyreveng3_cache.get(ins)
     if i:
+        instrument.count("macro_disass_cache_hits")
         return i
-    ram = mem.WordMem(0, 0x10, bits=16)
-    ram[0] = ins
-    ram[1] = 2
-    ram[2] = 0
-    ram[3] = 0
-    cpu = r1000.r1000()
-    cpu.m = ram
-    cpu.disass(0)
-    for i in ram:
-        j = i.render()
+    instrument.count("macro_disass_cache_misses")
+    j = render(ins)
+    if j is not None:
         add_to_cache(ins, j)
         return j
     return "PyReveng3 could not disassemble 0x%04x" % ins
+
+def disassemble_many(opcodes):
+    ''' Yield (ins, text) for each of `opcodes`, as disassemble() '''
+    for ins in opcodes:
+        yield ins, disassemble(ins)
+
+def main():
+    ''' ... '''
+    parser = argparse.ArgumentParser(description="Disassemble R1000 macro instructions")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--build", action="store_true", help="build " + TABLE_FILE)
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="check the shared cpu against a fresh one per instruction, for ins or those in " + CACHE_FILE,
+    )
+    parser.add_argument("ins", nargs="*", help="macro instructions to disassemble")
+    args = parser.parse_args()
+    if args.verify:
+        opcodes = [int(i, 0) for i in args.ins]
+        if not opcodes:
+            read_cache()
+            opcodes = sorted(on_disk)
+        bad = 0
+        for ins, shared, fresh in verify(opcodes):
+            print("0x%04x shared: %s" % (ins, shared))
+            print("0x%04x fresh:  %s" % (ins, fresh))
+            bad += 1
+        print("%d of %d macro instructions differ" % (bad, len(opcodes)))
+        sys.exit(bad != 0)
+    if args.build:
+        build_table(args.jobs)
+    for i in args.ins:
+        print("0x%04x" % int(i, 0), disassemble(int(i, 0)))
+
+if __name__ == "__main__":
+    main()
@@ -30,77 +30,607 @@
    ==============================================
 '''
 
+import argparse
+import array
+import bisect
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import sys
+import tracemalloc
+
 import r1k_ucode_m200_file as m200_file
 import r1k_ucode_explain
+import r1k_ucode_cfg
+import r1k_ucode_instrument as instrument
 import r1k_ucode_decoded as decoded
 
-class Uins(decoded.Ucode):
-    ''' subclass '''
+BOARDS = ("dispatch", "fiu", "ioc", "seq", "typ", "val")
+
+CACHE_DIR = "_r1k_ucode_cache"
+CACHE_MAGIC = b"R1kUcode"
+# Bump when what save_cache() writes changes
+CACHE_VERSION = 2
+
+# Changes to the generated decoder invalidate the cache
+with open(decoded.__file__, "rb") as _fi:
+    DECODER = hashlib.sha256(_fi.read()).hexdigest()
+
+def typecode(width):
+    ''' Smallest array typecode for a field whose top bit is `width` '''
+    if width < 8:
+        return "B"
+    if width < 16:
+        return "H"
+    return "L"
+
+def lanes(column):
+    ''' Pack a column of bytes into an integer with one 16 bit lane per byte '''
+    octets = bytearray(2 * len(column))
+    octets[0::2] = column
+    return int.from_bytes(octets, "little")
+
+def unlanes(value, count, width):
+    ''' Unpack `count` 16 bit lanes into an array for a field of `width` '''
+    octets = value.to_bytes(2 * count, "little")
+    if width < 8:
+        return array.array("B", octets[0::2])
+    retval = array.array("H", octets)
+    if sys.byteorder == "big":
+        retval.byteswap()
+    return retval
+
+def bitmap(octets, values):
+    ''' Integer with bit N set if octets[N] is in `values` '''
+    tbl = bytes(0x31 if i in values else 0x30 for i in range(256))
+    return int(octets.translate(tbl)[::-1], 2)
+
+def members(bits):
+    ''' Ascending list of the set bits in `bits` '''
+    txt = bin(bits)[:1:-1]
+    retval = []
+    i = txt.find("1")
+    while i >= 0:
+        retval.append(i)
+        i = txt.find("1", i + 1)
+    return retval
+
+def entry_macro(n):
+    ''' The macro instruction of dispatch RAM entry `n` '''
+    if n < 1024:
+        return n
+    return (n - 1024) * 64
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.macro_ins = []
+class Uins():
+    ''' A view of one micro instruction in a `Ucode` control store '''
+
+    __slots__ = ("ucode", "adr", "dstadr")
+
+    fields = decoded.Ucode.fields
 
     explainer = r1k_ucode_explain.Explain()
 
+    def __init__(self, ucode, adr):
+        self.ucode = ucode
+        self.adr = adr
+        self.dstadr = None
+
+    def __iter__(self):
+        for i in self.fields:
+            yield i, getattr(self, i)
+
+    @property
+    def uwords(self):
+        ''' The board uwords of this micro instruction, see Ucode.uwords() '''
+        return self.ucode.uwords(self.adr)
+
+    @property
+    def explain_key(self):
+        ''' Explanations are cached by this, see Explain.decode_text() '''
+        ucode = self.ucode
+        if not self.explainer.regfile_images:
+            return ucode.uwords(self.adr)
+        if ucode.regs_id is None:
+            ucode.regfile("typ")
+        return ucode.regs_id + ucode.uwords(self.adr)
+
+    @property
+    def macro_ins(self):
+        ''' Macro instructions dispatching to this micro instruction '''
+        return self.ucode.macros(self.adr)
+
     def explain(self):
         ''' Explain this micro instruction on stdout '''
-        print("%04x" % self.adr)
+        print(self.explain_text(), end="")
+
+    def explain_text(self):
+        ''' The explanation of this micro instruction, as printed by explain() '''
+        retval = ["%04x\n" % self.adr]
         for j in sorted(self.macro_ins):
-            print("  macro_ins: %04x" % j)
+            retval.append("  macro_ins: %04x\n" % j)
         for txt in self.explainer.decode_text(self):
-            print("   ", txt)
+            retval.append("    " + txt + "\n")
+        return "".join(retval)
 
-class Ucode():
-    ''' Decoded, ready to play with microcode '''
+def column_property(fld):
+    ''' Property reading field `fld` of a `Uins` from its `Ucode` '''
+    board = fld.split("_", 1)[0]
+
+    def getter(self):
+        ucode = self.ucode
+        col = ucode.columns.get(fld)
+        if col is None:
+            col = ucode.column(fld)
+        if ucode.present[board][self.adr]:
+            return col[self.adr]
+        return None
 
-    def __init__(self, *args, **kwargs):
+    return property(getter)
 
-        self.uins = [Uins(i) for i in range(1<<14)]
+for _fld in decoded.Ucode.fields:
+    setattr(Uins, _fld, column_property(_fld))
 
-        ucode = m200_file.R1kM200UcodeFile(*args, **kwargs)
-        self.timestamp = ucode.timestamp
-        self.ident = ucode.ident
-        self.hash = ucode.hash
+class Occupancy():
+    ''' Sorted runs of used, <default> and <halt> words in a `Ucode` '''
 
-        for mult, ucodes in (
-            (1, ucode.dispatch_ram_low()),
-            (64, ucode.dispatch_ram_high()),
+    USED = "used"
+    DEFAULT = "default"
+    HALT = "halt"
+
+    def __init__(self, ucode):
+        default, halt = ucode.wordclass()
+        nbits = 1 << 14
+        runs = []
+        for kind, bits in (
+            (self.USED, ~(default | halt) & ((1 << nbits) - 1)),
+            (self.DEFAULT, default),
+            (self.HALT, halt & ~default),
         ):
-            for n, i in enumerate(ucodes):
-                j = Uins(0)
-                j.load_dispatch_uword(i)
-                self.uins[j.dispatch_uadr].load_dispatch_uword(i)
-                self.uins[j.dispatch_uadr].macro_ins.append(n * mult)
-
-        for uins, fiu, ioc, seq, typ, val in zip(
-            self.uins[0x100:],
-            ucode.fiu_ucode(),
-            ucode.ioc_ucode(),
-            ucode.seq_ucode(),
-            ucode.typ_ucode(),
-            ucode.val_ucode(),
+            txt = format(bits, "0%db" % nbits)[::-1]
+            for i in re.finditer("1+", txt):
+                runs.append((i.start(), i.end(), kind))
+        runs.sort()
+        self.runs = runs
+        self.starts = [i[0] for i in runs]
+
+    def __iter__(self):
+        yield from self.runs
+
+    def kind(self, adr):
+        ''' Kind of word at `adr` '''
+        return self.runs[bisect.bisect_right(self.starts, adr) - 1][2]
+
+    def used(self, adr):
+        ''' Is `adr` neither a <default> nor a <halt> word '''
+        return self.kind(adr) == self.USED
+
+    def end(self):
+        ''' One past the last word which is not <default> '''
+        for lo, hi, kind in reversed(self.runs):
+            if kind != self.DEFAULT:
+                return hi
+        return 0
+
+class Ucode():
+    '''
+       Decoded, ready to play with microcode
+
+       The fields are stored column-wise, one array per field indexed
+       by micro address, and `present` tells which boards were loaded
+       at each address.  Indexing returns `Uins` views.
+
+       Unless `lazy=False`, a board is only decoded the first time one
+       of its fields is needed.
+
+       With `cache=True` the fully decoded state is saved in CACHE_DIR,
+       keyed by the file hash and the decoder, and mapped from there
+       by later instances.
+    '''
+
+    fields = decoded.Ucode.fields
+
+    def __init__(self, *args, lazy=True, cache=False, **kwargs):
+
+        self.columns = {}
+        self.layout = {}
+        self.present = {board: bytearray(1 << 14) for board in BOARDS}
+        self.entries = {}
+        self.macro_offsets = None
+        self.macro_values = None
+        self.classes = None
+        self.occ = None
+        self.flow = None
+        self.feet = None
+        self.regs = None
+        self.regs_id = None
+        self.regfill = {}
+
+        kwargs.setdefault("mapped", True)
+        with instrument.span("file"):
+            self.file = m200_file.R1kM200UcodeFile(*args, **kwargs)
+        self.timestamp = self.file.timestamp
+        self.ident = self.file.ident
+        self.hash = self.file.hash
+
+        if cache:
+            with instrument.span("cache"):
+                if not self.load_cache():
+                    self.save_cache()
+
+        if not lazy:
+            for board in BOARDS:
+                self.decode(board)
+
+    def decode(self, board):
+        ''' Decode all fields of `board` '''
+        if board in self.layout:
+            return
+        with instrument.span("decode_" + board):
+            self.decode_board(board)
+
+    def decode_board(self, board):
+        ''' Decode all fields of `board`, see decode() '''
+        flds = [fld for fld in self.fields if fld.split("_", 1)[0] == board]
+        if board == "dispatch":
+            self.decode_dispatch(flds)
+        else:
+            count = len(self.file)
+            kernel = getattr(decoded, "decode_%s_lanes" % board)
+            columns = getattr(self.file, board + "_columns")()
+            result = kernel([lanes(i) for i in columns], lanes(b'\x01' * count))
+            for fld, value in result.items():
+                self.columns[fld] = unlanes(value << (16 * 0x100), 1 << 14, self.fields[fld])
+            self.present[board][0x100:0x100 + count] = b'\x01' * count
+        self.layout[board] = flds
+
+    def decode_dispatch(self, flds):
+        '''
+           Decode the dispatch RAM
+
+           The entries are decoded in one go into `entries`, one array
+           per field indexed by entry number, see `entry_macro()`.
+           Each address gets the fields of the last entry dispatching
+           to it, and `macro_offsets`, `macro_values` is a compressed
+           sparse row index of all the macro instructions dispatching
+           to each address.
+        '''
+        columns = self.file.dispatch_ram_columns()
+        count = len(columns[0])
+        result = decoded.decode_dispatch_lanes(
+            [lanes(i) for i in columns],
+            lanes(b'\x01' * count)
+        )
+        for fld, value in result.items():
+            self.entries[fld] = unlanes(value, count, self.fields[fld])
+        uadr = self.entries["dispatch_uadr"]
+
+        last = {}
+        nmacro = array.array("L", [0]) * ((1 << 14) + 1)
+        for n, adr in enumerate(uadr):
+            last[adr] = n
+            nmacro[adr + 1] += 1
+        for adr in range(1 << 14):
+            nmacro[adr + 1] += nmacro[adr]
+        self.macro_offsets = nmacro
+        self.macro_values = array.array("H", [0]) * count
+        fill = array.array("L", nmacro)
+        for n, adr in enumerate(uadr):
+            self.macro_values[fill[adr]] = entry_macro(n)
+            fill[adr] += 1
+
+        for fld in flds:
+            col = array.array(typecode(self.fields[fld]), [0]) * (1 << 14)
+            src = self.entries[fld]
+            for adr, n in last.items():
+                col[adr] = src[n]
+            self.columns[fld] = col
+        for adr in last:
+            self.present["dispatch"][adr] = 1
+
+    def cache_name(self):
+        ''' Filename of our cache '''
+        return os.path.join(CACHE_DIR, "v%d_%s_%s.bin" % (CACHE_VERSION, self.hash[:16], DECODER[:16]))
+
+    def cache_parts(self):
+        ''' The (kind, name) of every part a complete cache holds '''
+        retval = set(("column", fld) for fld in self.fields)
+        retval.update(("entry", fld) for fld in self.fields if fld.split("_", 1)[0] == "dispatch")
+        retval.update(("present", board) for board in BOARDS)
+        retval.update((("macro_ins", "offsets"), ("macro_ins", "values")))
+        return retval
+
+    def save_cache(self):
+        ''' Decode everything and save it in the cache '''
+        for board in BOARDS:
+            self.decode(board)
+        parts = []
+        for fld, col in sorted(self.columns.items()):
+            parts.append(("column", fld, col))
+        for fld, col in sorted(self.entries.items()):
+            parts.append(("entry", fld, col))
+        for board, present in self.present.items():
+            parts.append(("present", board, array.array("B", present)))
+        parts.append(("macro_ins", "offsets", self.macro_offsets))
+        parts.append(("macro_ins", "values", self.macro_values))
+
+        hdr = {
+            "version": CACHE_VERSION,
+            "hash": self.hash,
+            "decoder": DECODER,
+            "byteorder": sys.byteorder,
+            "layout": self.layout,
+            "parts": [],
+        }
+        pos = 0
+        for kind, name, arr in parts:
+            hdr["parts"].append((kind, name, arr.typecode, pos, len(arr)))
+            pos += -(-len(arr) * arr.itemsize // 8) * 8
+        hdr = json.dumps(hdr).encode("ascii")
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = self.cache_name() + ".%d" % os.getpid()
+        with open(tmp, "wb") as fo:
+            fo.write(CACHE_MAGIC + len(hdr).to_bytes(4, "little") + hdr)
+            for kind, name, arr in parts:
+                fo.write(bytes(-fo.tell() % 8))
+                arr.tofile(fo)
+        os.replace(tmp, self.cache_name())
+
+    def load_cache(self):
+        ''' Map the decoded state from the cache, if there is one '''
+        try:
+            fi = open(self.cache_name(), "rb")
+        except FileNotFoundError:
+            return False
+        with fi:
+            view = memoryview(mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ))
+        if view[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+            return False
+        pos = len(CACHE_MAGIC) + 4
+        hlen = int.from_bytes(view[pos - 4:pos], "little")
+        hdr = json.loads(bytes(view[pos:pos + hlen]))
+        if (hdr.get("version"), hdr["hash"], hdr["decoder"], hdr["byteorder"]) != (
+            CACHE_VERSION, self.hash, DECODER, sys.byteorder
         ):
-            uins.load_fiu_uword(fiu)
-            uins.load_ioc_uword(ioc)
-            uins.load_seq_uword(seq)
-            uins.load_typ_uword(typ)
-            uins.load_val_uword(val)
+            return False
+        if set((i[0], i[1]) for i in hdr["parts"]) != self.cache_parts():
+            return False
+        base = -(-(pos + hlen) // 8) * 8
+        for kind, name, tcode, offset, count in hdr["parts"]:
+            size = array.array(tcode).itemsize
+            arr = view[base + offset:base + offset + count * size].cast(tcode)
+            if kind == "column":
+                self.columns[name] = arr
+            elif kind == "entry":
+                self.entries[name] = arr
+            elif kind == "present":
+                self.present[name] = arr
+            elif name == "offsets":
+                self.macro_offsets = arr
+            else:
+                self.macro_values = arr
+        self.layout = hdr["layout"]
+        return True
+
+    def column(self, name):
+        ''' The column of field `name`, decoding its board if need be '''
+        col = self.columns.get(name)
+        if col is None:
+            self.decode(name.split("_", 1)[0])
+            col = self.columns[name]
+        return col
+
+    def presence(self, board):
+        ''' Bitmap of addresses where `board` is loaded '''
+        self.decode(board)
+        return bitmap(bytes(self.present[board]), (1,))
+
+    def match(self, name, values):
+        ''' Bitmap of addresses where field `name` is one of `values` '''
+        col = self.column(name)
+        octets = col.tobytes()
+        if col.itemsize == 1:
+            bits = bitmap(octets, values)
+        else:
+            lobytes = octets[0::2]
+            hibytes = octets[1::2]
+            if sys.byteorder == "big":
+                lobytes, hibytes = hibytes, lobytes
+            bits = 0
+            for hib in set(i >> 8 for i in values):
+                lows = set(i & 0xff for i in values if i >> 8 == hib)
+                bits |= bitmap(hibytes, (hib,)) & bitmap(lobytes, lows)
+        return bits & self.presence(name.split("_", 1)[0])
+
+    def wordclass(self):
+        ''' Bitmaps of <default> and <halt> words, see Explain.bitmaps() '''
+        if self.classes is None:
+            self.classes = Uins.explainer.bitmaps(self)
+        return self.classes
+
+    def occupancy(self):
+        ''' The `Occupancy` of this control store '''
+        if self.occ is None:
+            self.occ = Occupancy(self)
+        return self.occ
+
+    def cfg(self):
+        ''' The `r1k_ucode_cfg.Cfg` of this control store '''
+        if self.flow is None:
+            self.flow = r1k_ucode_cfg.Cfg(self)
+        return self.flow
+
+    def footprints(self):
+        ''' The `r1k_ucode_cfg.Footprints` of this control store '''
+        if self.feet is None:
+            self.feet = r1k_ucode_cfg.Footprints(self)
+        return self.feet
+
+    def regfile(self, board):
+        '''
+           The (values, checks) arrays of the `board` register file,
+           indexed by frame * 32 + offset, see R1kM200UcodeFile.regfiles()
+        '''
+        if self.regs is None:
+            self.regs = self.file.regfiles()
+            for brd, (values, checks) in self.regs.items():
+                fill = {}
+                for i in zip(values, checks):
+                    fill[i] = fill.get(i, 0) + 1
+                self.regfill[brd] = max(fill, key=fill.get)
+            self.regs_id = hashlib.sha256(self.file.ucode[0x400:0x6400]).digest()[:8]
+        return self.regs[board]
+
+    def register(self, board, num):
+        '''
+           The (value, check) image of register `num` of `board`, as
+           stored in the file, None if it is the fill pattern most of
+           the register file has.  The bit order of the images is not
+           decoded.
+        '''
+        values, checks = self.regfile(board)
+        reg = (values[num], checks[num])
+        if reg == self.regfill[board]:
+            return None
+        return reg
+
+    def macros(self, adr):
+        ''' Macro instructions dispatching to `adr` '''
+        self.decode("dispatch")
+        return self.macro_values[self.macro_offsets[adr]:self.macro_offsets[adr + 1]]
+
+    def uwords(self, adr):
+        '''
+           The concatenated board uwords at `adr`
+
+           Words with the same uwords explain the same, so this is the
+           key of the explanation cache.  The dispatch RAM contributes
+           its decoded fields, as several entries may target `adr`.
+        '''
+        retval = b''
+        if 0x100 <= adr < 0x100 + len(self.file):
+            retval = bytes(self.file.record(adr - 0x100))
+        self.decode("dispatch")
+        if self.present["dispatch"][adr]:
+            retval += array.array(
+                "H",
+                (self.columns[fld][adr] for fld in self.layout["dispatch"])
+            ).tobytes()
+        return retval
+
+    def field(self, name, adr):
+        ''' Value of field `name` at `adr`, None if not loaded '''
+        if name not in self.fields:
+            raise AttributeError(name)
+        col = self.column(name)
+        if self.present[name.split("_", 1)[0]][adr]:
+            return col[adr]
+        return None
 
     def __getitem__(self, idx):
-        return self.uins.__getitem__(idx)
+        if isinstance(idx, slice):
+            return [Uins(self, i) for i in range(1 << 14)[idx]]
+        return Uins(self, range(1 << 14)[idx])
 
     def __iter__(self):
-        yield from self.uins[0x100:]
+        for adr in range(0x100, 1 << 14):
+            yield Uins(self, adr)
 
     def __len__(self):
-        return len(self.uins[0x100:])
+        return (1 << 14) - 0x100
+
+# Per process `Ucode` instances of the render workers
+UCODES = {}
+
+def render_chunk(job):
+    ''' Explanation of the words in [lo, hi) of `source` '''
+    source, lo, hi, regfile_images = job
+    Uins.explainer.regfile_images = regfile_images
+    ucode = UCODES.get(source)
+    if ucode is None:
+        ucode = UCODES[source] = Ucode(source, cache=True)
+    return "".join(ucode[adr].explain_text() for adr in range(lo, hi))
+
+def render(sources, fo, jobs=None, chunk=1024, regfile_images=False):
+    '''
+       Write the explanation of all words of each of `sources` to `fo`
+
+       The control stores are cut into chunks of `chunk` addresses,
+       explained by a pool of `jobs` processes and written in order.
+       The workers map the decoded stores from the cache, which is
+       created up front here.
+
+       With `regfile_images` the register file images are shown, see
+       Explain.register().
+    '''
+    work = []
+    for source in sources:
+        Ucode(source, cache=True)
+        work += [
+            (source, lo, min(lo + chunk, 1 << 14), regfile_images)
+            for lo in range(0x100, 1 << 14, chunk)
+        ]
+    if jobs == 1:
+        for job in work:
+            fo.write(render_chunk(job))
+        return
+    with multiprocessing.Pool(jobs) as pool:
+        for txt in pool.imap(render_chunk, work):
+            fo.write(txt)
+
+def memory_report(source):
+    ''' Measure a fully loaded control store as records and as columns '''
+    tracemalloc.start()
+    ucode = m200_file.R1kM200UcodeFile(source)
+    base = tracemalloc.get_traced_memory()[0]
+    records = [decoded.Ucode(i) for i in range(1 << 14)]
+    for uins, fiu, ioc, seq, typ, val in zip(
+        records[0x100:],
+        ucode.fiu_ucode(),
+        ucode.ioc_ucode(),
+        ucode.seq_ucode(),
+        ucode.typ_ucode(),
+        ucode.val_ucode(),
+    ):
+        uins.load_fiu_uword_lut(fiu)
+        uins.load_ioc_uword_lut(ioc)
+        uins.load_seq_uword_lut(seq)
+        uins.load_typ_uword_lut(typ)
+        uins.load_val_uword_lut(val)
+    nrec = tracemalloc.get_traced_memory()[0] - base
+    del records
+    base = tracemalloc.get_traced_memory()[0]
+    columns = Ucode(source, lazy=False)
+    ncol = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    print("File:", source, columns.hash)
+    print("  %-24s %10d bytes %6d per word" % ("decoded.Ucode records", nrec, nrec >> 14))
+    print("  %-24s %10d bytes %6d per word" % ("Ucode columns", ncol, ncol >> 14))
 
 def main():
     ''' ... '''
-    i = Ucode()
-    for j in i:
-        j.explain()
+    parser = argparse.ArgumentParser(description="Explain R1000 microcode")
+    parser.add_argument("--memory", action="store_true", help="report memory use")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument(
+        "--regfile-images", action="store_true",
+        help="show the register file images of registers, as stored, not decoded",
+    )
+    parser.add_argument("source", nargs="*", default=["FPTEST.M200_UCODE"])
+    args = parser.parse_args()
+    if args.memory:
+        for source in args.source:
+            memory_report(source)
+        return
+    if args.output:
+        with open(args.output, "w") as fo:
+            render(args.source, fo, args.jobs, regfile_images=args.regfile_images)
+    else:
+        render(args.source, sys.stdout, args.jobs, regfile_images=args.regfile_images)
 
 if __name__ == "__main__":
     main()
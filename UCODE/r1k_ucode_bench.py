@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2012-2021 Poul-Henning Kamp <phk@phk.freebsd.dk>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL AUTHOR OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+
+
+'''
+   Benchmarks of loading, decoding, explaining and listing microcode
+   =================================================================
+
+   Each benchmark starts from a fresh `Ucode` without the disk cache,
+   runs a number of times and the fastest run counts:
+
+	python3 r1k_ucode_bench.py --save baseline.json
+	... hack ...
+	python3 r1k_ucode_bench.py --compare baseline.json
+
+   The comparison flags benchmarks which got slower than the baseline
+   by more than the threshold, and exits non-zero if any did.
+
+   The disass_ucode benchmark only runs if PyReveng3 is available.
+'''
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import r1k_ucode
+import r1k_ucode_m200_file as m200_file
+import r1k_ucode_listing
+import r1k_ucode_instrument as instrument
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "M207_54.M200_UCODE")
+
+def forget():
+    ''' Forget the explanations of earlier runs '''
+    explain = r1k_ucode.Uins.explainer
+    explain.text_cache.clear()
+    explain.plans.clear()
+
+def fresh(source, lazy=True):
+    ''' A `Ucode` of `source` with nothing cached '''
+    forget()
+    return r1k_ucode.Ucode(source, lazy=lazy)
+
+def setup_parse(source):
+    return source
+
+def run_parse(source):
+    ''' Read the file and cut out all columns '''
+    ucode = m200_file.R1kM200UcodeFile(source)
+    for board in ("fiu", "ioc", "seq", "typ", "val"):
+        getattr(ucode, board + "_columns")()
+    ucode.dispatch_ram_columns()
+    ucode.regfiles()
+
+def setup_decode(source):
+    return fresh(source)
+
+def run_decode(ucode):
+    ''' Decode all boards '''
+    for board in r1k_ucode.BOARDS:
+        ucode.decode(board)
+
+def setup_isdefault(source):
+    return fresh(source, lazy=False)
+
+def run_isdefault(ucode):
+    ''' Ask isdefault() of every word '''
+    explain = r1k_ucode.Uins.explainer
+    for uins in ucode:
+        explain.isdefault(uins)
+
+def setup_explain(source):
+    ucode = fresh(source, lazy=False)
+    ucode.wordclass()
+    ucode.regfile("typ")
+    return ucode
+
+def run_explain(ucode):
+    ''' Explain every word '''
+    explain = r1k_ucode.Uins.explainer
+    for uins in ucode:
+        explain.decode_text(uins)
+
+def setup_listing(source):
+    return fresh(source)
+
+def run_listing(ucode):
+    ''' The r1k_ucode_listing of the whole control store '''
+    r1k_ucode_listing.Listing(ucode).write(io.StringIO())
+
+def setup_disass(source):
+    forget()
+    return source
+
+def run_disass(source):
+    '''
+       The disass_ucode listing of the whole control store
+
+       disass_ucode maps the decoded store from the disk cache, so
+       this is the warm cache case.
+    '''
+    import disass_ucode
+    with tempfile.TemporaryDirectory() as tmp:
+        disass_ucode.disass_file((source, os.path.join(tmp, "listing"), False))
+
+def have_pyreveng():
+    ''' Can disass_ucode be used '''
+    try:
+        import disass_ucode
+    except ImportError:
+        return False
+    return True
+
+BENCHMARKS = {
+    "parse": (setup_parse, run_parse),
+    "decode": (setup_decode, run_decode),
+    "isdefault": (setup_isdefault, run_isdefault),
+    "explain": (setup_explain, run_explain),
+    "listing": (setup_listing, run_listing),
+    "disass_ucode": (setup_disass, run_disass),
+}
+
+def bench(name, source, repeat=5, memory=False):
+    '''
+       Run benchmark `name` `repeat` times, each on a fresh setup
+
+       With `memory`, one more run is traced to measure its peak memory,
+       not counting the setup.
+    '''
+    setup, run = BENCHMARKS[name]
+    runs = []
+    for _i in range(repeat):
+        state = setup(source)
+        t0 = time.perf_counter()
+        run(state)
+        runs.append(round(time.perf_counter() - t0, 6))
+    retval = {"seconds": min(runs), "runs": runs}
+    if memory:
+        state = setup(source)
+        instrument.enable()
+        with instrument.span(name):
+            run(state)
+        retval["peak_bytes"] = instrument.report()["spans"][-1]["peak_bytes"]
+        instrument.disable()
+    return retval
+
+def suite(source=SOURCE, names=None, repeat=5, memory=False, fo=sys.stdout):
+    ''' Run the benchmarks `names`, all by default, returns the results '''
+    if names is None:
+        names = list(BENCHMARKS)
+        if not have_pyreveng():
+            names.remove("disass_ucode")
+            fo.write("# disass_ucode skipped, no PyReveng3\n")
+    retval = {
+        "source": os.path.basename(source),
+        "hash": m200_file.R1kM200UcodeFile(source).hash,
+        "python": platform.python_version(),
+        "repeat": repeat,
+        "results": {},
+    }
+    for name in names:
+        result = bench(name, source, repeat, memory)
+        retval["results"][name] = result
+        txt = "%-14s %10.4f s" % (name, result["seconds"])
+        if "peak_bytes" in result:
+            txt += " %12d bytes" % result["peak_bytes"]
+        fo.write(txt + "\n")
+    return retval
+
+def compare(baseline, current, threshold=0.10, fo=sys.stdout):
+    '''
+       Compare `current` results to `baseline`, returns the names of
+       the benchmarks which got slower by more than `threshold`.
+    '''
+    if baseline.get("hash") != current.get("hash"):
+        fo.write("# baseline is of %s, not %s\n" % (baseline.get("source"), current.get("source")))
+    retval = []
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            fo.write("%-14s %10s   %10.4f s  (new)\n" % (name, "-", result["seconds"]))
+            continue
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] else 1.0
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            retval.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        fo.write("%-14s %10.4f s %10.4f s  %+6.1f%%%s\n" % (
+            name, old["seconds"], result["seconds"], (ratio - 1) * 100, flag
+        ))
+    return retval
+
+def main():
+    ''' ... '''
+    parser = argparse.ArgumentParser(description="Benchmark R1000 microcode decoding and explaining")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="runs per benchmark (default: 5)")
+    parser.add_argument("--memory", action="store_true", help="also measure peak memory")
+    parser.add_argument("--save", help="write the results to this baseline file")
+    parser.add_argument("--compare", help="compare the results to this baseline file")
+    parser.add_argument("--threshold", type=float, default=0.10,
+        help="slowdown flagged as a regression (default: 0.10)")
+    parser.add_argument("--source", default=SOURCE, help="microcode file (default: M207_54)")
+    parser.add_argument("bench", nargs="*", help="benchmarks: " + ", ".join(BENCHMARKS) + " (default: all)")
+    args = parser.parse_args()
+    for i in args.bench:
+        if i not in BENCHMARKS:
+            parser.error("unknown benchmark " + i)
+    results = suite(args.source, args.bench or None, args.repeat, args.memory)
+    if args.save:
+        with open(args.save, "w") as fo:
+            json.dump(results, fo, indent=2)
+            fo.write("\n")
+    if args.compare:
+        with open(args.compare) as fi:
+            baseline = json.load(fi)
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
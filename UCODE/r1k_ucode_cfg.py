@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2012-2021 Poul-Henning Kamp <phk@phk.freebsd.dk>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL AUTHOR OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+
+'''
+   Control flow graph of the microcode
+   ===================================
+
+   Built from seq_br_type, seq_branch_adr and seq_cond_sel alone.
+
+   Calls and pushes also flow to the next word, where the return will
+   come back to, returns and dispatches have no static successors.
+   Conditional returns and dispatches which are not taken go to their
+   branch address or the next word.  Case branches flow to all
+   CASE_ARMS words from their branch address.
+
+   Branches on the constant conditions in CONST_COND are resolved.
+
+   Returns and dispatches go to addresses computed at run time, from
+   the micro stack, the dispatch RAM or the TYP/VAL bus, so code is
+   also entered in ways the graph cannot see.  A word which is not
+   reachable from the roots is therefore not known to be dead, only
+   words without any predecessor are flagged, see no_entry().
+'''
+
+import array
+
+import r1k_ucode_explain
+
+FALL = "fall"
+BRANCH = "branch"
+CASE = "case"
+
+# A case branch adds a four bit case value to the branch address
+CASE_ARMS = 16
+
+# seq_br_type: (successors if taken, successors if not, taken on)
+# `taken on` is None for unconditional types.
+BR_TYPE = {
+    0x0: ((BRANCH,), (FALL,), False),           # Branch False
+    0x1: ((BRANCH,), (FALL,), True),            # Branch True
+    0x2: ((BRANCH, FALL), (), None),            # Push (branch address)
+    0x3: ((BRANCH,), (), None),                 # Unconditional Branch
+    0x4: ((BRANCH, FALL), (FALL,), False),      # Call False
+    0x5: ((BRANCH, FALL), (FALL,), True),       # Call True
+    0x6: ((FALL,), (), None),                   # Continue
+    0x7: ((BRANCH, FALL), (), None),            # Unconditional Call
+    0x8: ((), (BRANCH, FALL), True),            # Return True
+    0x9: ((), (BRANCH, FALL), False),           # Return False
+    0xa: ((), (), None),                        # Unconditional Return
+    0xb: ((CASE,), (FALL,), False),             # Case False
+    0xc: ((), (BRANCH, FALL), True),            # Dispatch True
+    0xd: ((), (BRANCH, FALL), False),           # Dispatch False
+    0xe: ((), (), None),                        # Unconditional Dispatch
+    0xf: ((CASE, FALL), (), None),              # Unconditional Case Call
+}
+
+# seq_cond_sel values which are constant
+CONST_COND = {
+    0x16: True,         # VAL.TRUE(early)
+    0x17: False,        # VAL.FALSE(early)
+    0x25: False,        # TYP.FALSE (early)
+    0x26: True,         # TYP.TRUE (early)
+}
+
+def csr(edges, count):
+    ''' Compressed sparse rows of (src, dst) `edges`, sorted by src '''
+    offsets = array.array("L", [0]) * (count + 1)
+    for src, _dst in edges:
+        offsets[src + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    values = array.array("H", [0]) * len(edges)
+    fill = array.array("L", offsets)
+    for src, dst in edges:
+        values[fill[src]] = dst
+        fill[src] += 1
+    return offsets, values
+
+class Cfg():
+    '''
+       Control flow graph of a `r1k_ucode.Ucode`
+
+       Successors and predecessors are stored as compressed sparse
+       rows indexed by micro address, `reachable` has a one for every
+       word reachable from `roots`.
+    '''
+
+    def __init__(self, ucode):
+        self.ucode = ucode
+        nadr = 1 << 14
+        present = ucode.present["seq"]
+        br_type = ucode.column("seq_br_type")
+        branch_adr = ucode.column("seq_branch_adr")
+        cond_sel = ucode.column("seq_cond_sel")
+
+        edges = set()
+        for adr in range(nadr):
+            if not present[adr]:
+                continue
+            taken, not_taken, taken_on = BR_TYPE[br_type[adr]]
+            const = CONST_COND.get(cond_sel[adr])
+            if taken_on is None or const == taken_on:
+                kinds = taken
+            elif const is not None:
+                kinds = not_taken
+            else:
+                kinds = taken + not_taken
+            for kind in kinds:
+                if kind == BRANCH:
+                    edges.add((adr, branch_adr[adr]))
+                elif kind == CASE:
+                    for arm in range(branch_adr[adr], min(branch_adr[adr] + CASE_ARMS, nadr)):
+                        edges.add((adr, arm))
+                elif adr + 1 < nadr:
+                    edges.add((adr, adr + 1))
+
+        edges = sorted(edges)
+        self.succ_offsets, self.succ_values = csr(edges, nadr)
+        edges.sort(key=lambda x: (x[1], x[0]))
+        self.pred_offsets, self.pred_values = csr([(j, i) for i, j in edges], nadr)
+
+        explain = r1k_ucode_explain.Explain()
+        roots = {0x100}
+        roots.update(explain.early_macro_events)
+        roots.update(explain.late_macro_events)
+        roots.update(explain.micro_events)
+        ucode.decode("dispatch")
+        roots.update(adr for adr in range(nadr) if ucode.present["dispatch"][adr])
+        self.roots = sorted(roots)
+
+        self.reachable = bytearray(nadr)
+        todo = list(self.roots)
+        while todo:
+            adr = todo.pop()
+            if self.reachable[adr]:
+                continue
+            self.reachable[adr] = 1
+            todo.extend(self.successors(adr))
+
+    def successors(self, adr):
+        ''' Words control can flow to from `adr` '''
+        return self.succ_values[self.succ_offsets[adr]:self.succ_offsets[adr + 1]]
+
+    def predecessors(self, adr):
+        ''' Words control can flow to `adr` from '''
+        return self.pred_values[self.pred_offsets[adr]:self.pred_offsets[adr + 1]]
+
+    def no_entry(self, adr):
+        '''
+           Is `adr` neither reachable from the roots nor the successor
+           of any word, so only a computed address could get there
+        '''
+        return not self.reachable[adr] and not len(self.predecessors(adr))
+
+    def come_from(self, adr):
+        ''' Predecessors of `adr` other than falling through from `adr - 1` '''
+        return [i for i in self.predecessors(adr) if i != adr - 1]
+
+def components(cfg):
+    '''
+       Strongly connected components of `cfg`, Tarjan's algorithm
+
+       Returns the component number of every address and the members
+       of each component.  Components are numbered in reverse
+       topological order: successors come first.
+    '''
+    nadr = len(cfg.reachable)
+    index = array.array("l", [-1]) * nadr
+    low = array.array("l", [0]) * nadr
+    comp = array.array("l", [-1]) * nadr
+    onstack = bytearray(nadr)
+    stack = []
+    members = []
+    counter = 0
+    for root in range(nadr):
+        if index[root] >= 0:
+            continue
+        work = [(root, 0)]
+        while work:
+            adr, pos = work.pop()
+            if pos == 0:
+                index[adr] = low[adr] = counter
+                counter += 1
+                stack.append(adr)
+                onstack[adr] = 1
+            succ = cfg.successors(adr)
+            while pos < len(succ):
+                dst = succ[pos]
+                pos += 1
+                if index[dst] < 0:
+                    work.append((adr, pos))
+                    work.append((dst, 0))
+                    break
+                if onstack[dst]:
+                    low[adr] = min(low[adr], index[dst])
+            else:
+                if low[adr] == index[adr]:
+                    scc = []
+                    while True:
+                        i = stack.pop()
+                        onstack[i] = 0
+                        comp[i] = len(members)
+                        scc.append(i)
+                        if i == adr:
+                            break
+                    members.append(scc)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[adr])
+    return comp, members
+
+class Footprints():
+    '''
+       Micro addresses reachable from each macro instruction
+
+       Footprints are integer bitmaps (bit N = micro address N),
+       computed per strongly connected component of the `Cfg`.  The
+       footprints of components entered from more than one place, and
+       of dispatch targets, are memoized, so macro instructions reaching
+       the same code share the same bitmaps.
+    '''
+
+    def __init__(self, ucode):
+        self.ucode = ucode
+        self.cfg = ucode.cfg()
+        self.comp, self.members = components(self.cfg)
+        self.memo = {}
+
+        # Only footprints used more than once are kept in `memo`
+        npred = {}
+        for adr in range(len(self.comp)):
+            for dst in self.cfg.successors(adr):
+                if self.comp[dst] != self.comp[adr]:
+                    npred.setdefault(self.comp[dst], set()).add(self.comp[adr])
+        self.keep = set(i for i, j in npred.items() if len(j) > 1)
+        self.keep.update(self.comp[adr] for adr in self.cfg.roots)
+
+        self.targets = {}
+        for adr in self.cfg.roots:
+            for opcode in ucode.macros(adr):
+                self.targets.setdefault(opcode, []).append(adr)
+
+    def component(self, comp):
+        ''' Footprint of component `comp` '''
+        retval = self.memo.get(comp)
+        if retval is not None:
+            return retval
+        # Successor components have lower numbers, fill in from below
+        todo = [comp]
+        while todo:
+            i = todo[-1]
+            if i in self.memo:
+                todo.pop()
+                continue
+            succ = set()
+            for adr in self.members[i]:
+                for dst in self.cfg.successors(adr):
+                    j = self.comp[dst]
+                    if j != i:
+                        succ.add(j)
+            missing = [j for j in succ if j not in self.memo]
+            if missing:
+                todo.extend(missing)
+                continue
+            todo.pop()
+            bits = 0
+            for adr in self.members[i]:
+                bits |= 1 << adr
+            for j in succ:
+                bits |= self.memo[j]
+                if j not in self.keep:
+                    del self.memo[j]
+            self.memo[i] = bits
+        retval = self.memo[comp]
+        if comp not in self.keep:
+            del self.memo[comp]
+        return retval
+
+    def footprint(self, adr):
+        ''' Bitmap of micro addresses reachable from `adr` '''
+        return self.component(self.comp[adr])
+
+    def macro(self, opcode):
+        ''' Bitmap of micro addresses reachable from macro instruction `opcode` '''
+        bits = 0
+        for adr in self.targets.get(opcode, ()):
+            bits |= self.footprint(adr)
+        return bits
+
+    def reaching(self, adr):
+        ''' Sorted macro instructions which can reach micro address `adr` '''
+        return sorted(
+            opcode for opcode, uadrs in self.targets.items()
+            if any(self.footprint(i) >> adr & 1 for i in uadrs)
+        )
@@ -38,6 +38,14 @@
    parallel-out registers in `r1k_ucode_diag_chains.py` from which
    this creates `r1k_ucode_decoded.py`.
 
+   Besides the per-word `load_*_uword()` methods, we also write
+   `decode_*_lanes()` functions which decode a field for all words
+   of the control store in one go, see `write_kernel()` below, and
+   table driven `load_*_uword_lut()` methods, see `write_lut()`.
+
+   `Ucode` decodes whole control stores with the kernels, the per-word
+   loaders are for words which come one at a time.
+
    When we get there, this program will also write a similar set
    of functions as C-source for the emulator.
 '''
@@ -46,6 +54,9 @@ import r1k_ucode_diag_chains as diag_chains
 
 DOCCMT = "''' Machine Generated file, see r1k_ucode_codegen.p '''"
 
+# The unused bits of these chains are not reliably zero in .M200_UCODE files
+UNCHECKED = ("val", "ioc")
+
 class Chain():
     ''' One serial-parallel register chain '''
 
@@ -67,6 +78,172 @@ class Chain():
                 retval[idx] |= 1 << bit
         return retval
 
+    def layout(self, name, fields):
+        ''' Bit offsets of the fields packed into one integer, and total width '''
+        retval = {}
+        offset = 0
+        for fname in sorted(fields):
+            if fname.split("_", 1)[0] == name:
+                retval[fname] = offset
+                offset += fields[fname] + 1
+        return retval, offset
+
+    def steps(self, name):
+        '''
+           The decoding steps for the chain:
+               ("byte", idx, xor)
+               ("bit", fname, first, mask, shift)
+               ("check", mask)
+           A positive shift is to the left.
+        '''
+        xor = self.xor()
+        idxo = -1
+        xmask = 0
+        seen_fld = set()
+        for idx, bit, field in self:
+            if idxo != idx:
+                if xmask:
+                    yield "check", xmask
+                    xmask = 0
+                yield "byte", idx, xor[idx]
+                idxo = idx
+            if field[1][0] == 'x':
+                xmask |= 1 << bit
+                continue
+            fname = name + "_" + field[1]
+            yield "bit", fname, fname not in seen_fld, 1 << bit, field[2] - bit
+            seen_fld.add(fname)
+        if xmask:
+            yield "check", xmask
+
+def shifted(expr, shift):
+    ''' Shift expression left (positive) or right (negative) '''
+    if shift > 0:
+        return "%s << %d" % (expr, shift)
+    if shift < 0:
+        return "%s >> %d" % (expr, -shift)
+    return expr
+
+def write_loader(fo, name, chain):
+    ''' Decode one uword, one bit at a time '''
+    fo.write("\n")
+    fo.write("    def load_%s_uword(self, uword):\n" % name)
+    fo.write('        ' + DOCCMT + "\n")
+    fo.write('\n')
+    fo.write("        self.%s_uword = bytes(uword)\n" % name)
+    for step in chain.steps(name):
+        if step[0] == "byte":
+            fo.write("\n")
+            if step[2]:
+                fo.write("        a = uword[%d] ^ 0x%02x\n" % step[1:])
+            else:
+                fo.write("        a = uword[%d]\n" % step[1])
+        elif step[0] == "check":
+            if name in UNCHECKED:
+                fo.write("        # assert not a & 0x%02x\n" % step[1])
+            else:
+                fo.write("        assert not a & 0x%02x\n" % step[1])
+        else:
+            _, fname, first, mask, shift = step
+            t = "self.%s %s " % (fname, "=" if first else "|=")
+            fo.write(" " * 8 + t + shifted("(a & 0x%02x)" % mask, shift) + "\n")
+
+def write_kernel(fo, name, chain):
+    '''
+       Decode all uwords of the control store at once
+
+       Each uword byte is a column of the control store packed into
+       one python integer, with a 16 bit lane per word.  `rep` has the
+       bottom bit of every lane set, so `0x40 * rep` is 0x40 in every
+       lane.  Since no field is 16 bits wide, the shifts never move
+       bits from one lane into another once masked.
+    '''
+    fo.write("\n")
+    fo.write("def decode_%s_lanes(uword, rep):\n" % name)
+    fo.write('    ' + DOCCMT + "\n")
+    fo.write('\n')
+    fo.write("    retval = {}\n")
+    for step in chain.steps(name):
+        if step[0] == "byte":
+            fo.write("\n")
+            if step[2]:
+                fo.write("    a = uword[%d] ^ 0x%02x * rep\n" % step[1:])
+            else:
+                fo.write("    a = uword[%d]\n" % step[1])
+        elif step[0] == "check":
+            if name in UNCHECKED:
+                fo.write("    # assert not a & 0x%02x * rep\n" % step[1])
+            else:
+                fo.write("    assert not a & 0x%02x * rep\n" % step[1])
+        else:
+            _, fname, first, mask, shift = step
+            t = 'retval["%s"] %s ' % (fname, "=" if first else "|=")
+            fo.write(" " * 4 + t + shifted("(a & 0x%02x * rep)" % mask, shift) + "\n")
+    fo.write("\n")
+    fo.write("    return retval\n")
+
+def write_lut(fo, name, chain, fields):
+    '''
+       Table driven decoding of one uword
+
+       The fields of the chain are packed into one integer, and for
+       each byte of the uword a 256 entry table holds that byte's
+       contribution to the packed fields, already XOR-corrected.
+       Bits which must be zero contribute an error bit instead, so
+       a single assert checks the entire uword.
+
+       Only the per-bit contributions are emitted, the tables are
+       expanded the first time they are needed, so they cost nothing
+       when the module is imported.
+    '''
+    layout, width = chain.layout(name, fields)
+    error = 0
+    if name not in UNCHECKED:
+        error = 1 << width
+
+    contrib = [[0] * 8 for i in range(chain.nbytes)]
+    for idx, bit, field in chain:
+        if field[1][0] == 'x':
+            contrib[idx][7 - bit] = error
+        else:
+            fname = name + "_" + field[1]
+            contrib[idx][7 - bit] = 1 << (layout[fname] + field[2])
+
+    uname = name.upper()
+    fo.write("\n")
+    fo.write("%s_ERROR = 0x%x\n" % (uname, error))
+    fo.write("\n")
+    fo.write("%s_BITS = (\n" % uname)
+    for xor, bits in zip(chain.xor(), contrib):
+        fo.write("    (0x%02x, (%s)),\n" % (xor, ", ".join("0x%x" % i for i in bits)))
+    fo.write(")\n")
+    fo.write("\n")
+    fo.write("%s_LUT = None\n" % uname)
+    fo.write("\n")
+    fo.write("def pack_%s_uword(uword):\n" % name)
+    fo.write('    ' + DOCCMT + "\n")
+    fo.write('    global %s_LUT\n' % uname)
+    fo.write('    tbl = %s_LUT\n' % uname)
+    fo.write('    if tbl is None:\n')
+    fo.write('        tbl = %s_LUT = tuple(lut(*i) for i in %s_BITS)\n' % (uname, uname))
+    t = " | ".join("tbl[%d][uword[%d]]" % (i, i) for i in range(chain.nbytes))
+    fo.write("    a = %s\n" % t)
+    if error:
+        fo.write("    assert not a & %s_ERROR\n" % uname)
+    fo.write("    return a\n")
+
+def write_lut_loader(fo, name, layout, fields):
+    ''' Unpack the fields from the packed integer '''
+    fo.write("\n")
+    fo.write("    def load_%s_uword_lut(self, uword):\n" % name)
+    fo.write('        ' + DOCCMT + "\n")
+    fo.write('\n')
+    fo.write("        self.%s_uword = bytes(uword)\n" % name)
+    fo.write("        a = pack_%s_uword(uword)\n" % name)
+    for fname, offset in layout.items():
+        mask = (1 << (fields[fname] + 1)) - 1
+        fo.write("        self.%s = %s\n" % (fname, shifted("a", -offset) + " & 0x%x" % mask))
+
 def main():
     ''' ... '''
 
@@ -96,15 +273,28 @@ def main():
             t = max(t, field[2])
             fields[fname] = t
 
+    # The lanes of the whole-store kernels are 16 bits wide
+    assert max(fields.values()) < 16
+
+    members = ["adr"]
+    members += [name + "_uword" for name in chains]
+    members += ["macro_ins", "dstadr"]
+
     fo.write('class Ucode():')
     fo.write('\n')
     fo.write('    ' + DOCCMT + "\n")
     fo.write('\n')
+    fo.write('    __slots__ = (\n')
+    for i in members + sorted(fields):
+        fo.write('        "%s",\n' % i)
+    fo.write('    )\n')
+    fo.write('\n')
     fo.write('    def __init__(self, adr):\n')
     fo.write('        self.adr = adr\n')
     for name in chains:
         fo.write('        self.%s_uword = None\n' % name)
-    fo.write('        self.dispatch_macro_ins = []\n')
+    fo.write('        self.macro_ins = []\n')
+    fo.write('        self.dstadr = None\n')
     for i in sorted(fields):
         fo.write('        self.%s = None\n' % i)
 
@@ -119,47 +309,31 @@ def main():
     fo.write("        for i in self.fields:\n")
     fo.write("            yield i, getattr(self, i)\n")
 
+    for name, chain in chains.items():
+        write_loader(fo, name, chain)
+
+    for name, chain in chains.items():
+        write_lut_loader(fo, name, chain.layout(name, fields)[0], fields)
+
     for name, chain in chains.items():
         fo.write("\n")
-        fo.write("    def load_%s_uword(self, uword):\n" % name)
-        fo.write('        ' + DOCCMT + "\n")
-        fo.write('\n')
-        xor = chain.xor()
-        idxo = -1
-        fo.write("        self.%s_uword = bytes(uword)\n" % name)
-        xmask = 0
-        seen_fld = set()
-        for idx, bit, field in chain:
-            fname = name + "_" + field[1]
-            if idxo != idx:
-                if xmask:
-                    fo.write(" " * 8 + "assert not a & 0x%02x\n" % xmask)
-                    xmask = 0
-                fo.write("\n")
-                if xor[idx]:
-                    fo.write("        a = uword[%d] ^ 0x%02x\n" % (idx, xor[idx]))
-                else:
-                    fo.write("        a = uword[%d]\n" % idx)
-                idxo = idx
-            if field[1][0] == 'x':
-                xmask |= 1 << bit
-                continue
-            t = "self.%s " % fname
-            if fname in seen_fld:
-                t += "|="
-            else:
-                t += "="
-                seen_fld.add(fname)
-            t += " (a & 0x%02x)" % (1 << bit)
-            t = " " * 8 + t
-            if bit == field[2]:
-                fo.write(t + "\n")
-            elif bit < field[2]:
-                fo.write("%s << %d\n" % (t, field[2] - bit))
-            else:
-                fo.write("%s >> %d\n" % (t, bit - field[2]))
-        if xmask:
-            fo.write(" " * 8 + "assert not a & 0x%02x\n" % xmask)
+        write_kernel(fo, name, chain)
+
+    fo.write("\n")
+    fo.write("def lut(xor, contrib):\n")
+    fo.write("    ''' Expand per-bit contributions, MSB first, to a 256 entry table '''\n")
+    fo.write("    retval = []\n")
+    fo.write("    for i in range(256):\n")
+    fo.write("        i ^= xor\n")
+    fo.write("        # OR, not add: all must-be-zero bits contribute the same error bit\n")
+    fo.write("        a = 0\n")
+    fo.write("        for n, j in enumerate(contrib):\n")
+    fo.write("            if i & (0x80 >> n):\n")
+    fo.write("                a |= j\n")
+    fo.write("        retval.append(a)\n")
+    fo.write("    return tuple(retval)\n")
+    for name, chain in chains.items():
+        write_lut(fo, name, chain, fields)
 
 if __name__ == "__main__":
     main()
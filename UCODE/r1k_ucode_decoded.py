@@ -1,9 +1,87 @@
 #!/usr/bin/env python3
 
-''' Machine Generated file, see r1k_ucode_codegen.p'''
+''' Machine Generated file, see r1k_ucode_codegen.p '''
 
 class Ucode():
-    ''' Machine Generated file, see r1k_ucode_codegen.p'''
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+    __slots__ = (
+        "adr",
+        "dispatch_uword",
+        "seq_uword",
+        "fiu_uword",
+        "typ_uword",
+        "val_uword",
+        "ioc_uword",
+        "macro_ins",
+        "dstadr",
+        "dispatch_csa_free",
+        "dispatch_csa_valid",
+        "dispatch_cur_class",
+        "dispatch_ibuff_fill",
+        "dispatch_ignore",
+        "dispatch_mem_strt",
+        "dispatch_parity",
+        "dispatch_uadr",
+        "dispatch_uses_tos",
+        "fiu_fill_mode_src",
+        "fiu_len_fill_lit",
+        "fiu_len_fill_reg_ctl",
+        "fiu_length_src",
+        "fiu_load_mdr",
+        "fiu_load_oreg",
+        "fiu_load_tar",
+        "fiu_load_var",
+        "fiu_mem_start",
+        "fiu_offs_lit",
+        "fiu_offset_src",
+        "fiu_op_sel",
+        "fiu_oreg_src",
+        "fiu_parity",
+        "fiu_rdata_src",
+        "fiu_tivi_src",
+        "fiu_vmux_sel",
+        "ioc_adrbs",
+        "ioc_fiubs",
+        "ioc_load_wdr",
+        "ioc_parity",
+        "ioc_random",
+        "ioc_tvbs",
+        "seq_b_timing",
+        "seq_br_type",
+        "seq_branch_adr",
+        "seq_cond_sel",
+        "seq_en_micro",
+        "seq_int_reads",
+        "seq_latch",
+        "seq_lex_adr",
+        "seq_parity",
+        "seq_random",
+        "typ_a_adr",
+        "typ_alu_func",
+        "typ_b_adr",
+        "typ_c_adr",
+        "typ_c_lit",
+        "typ_c_mux_sel",
+        "typ_c_source",
+        "typ_csa_cntl",
+        "typ_frame",
+        "typ_mar_cntl",
+        "typ_parity",
+        "typ_priv_check",
+        "typ_rand",
+        "val_a_adr",
+        "val_alu_func",
+        "val_b_adr",
+        "val_c_adr",
+        "val_c_mux_sel",
+        "val_c_source",
+        "val_frame",
+        "val_m_a_src",
+        "val_m_b_src",
+        "val_parity",
+        "val_rand",
+    )
 
     def __init__(self, adr):
         self.adr = adr
@@ -13,13 +91,13 @@ class Ucode():
         self.typ_uword = None
         self.val_uword = None
         self.ioc_uword = None
-        self.dispatch_macro_ins = None
+        self.macro_ins = []
+        self.dstadr = None
         self.dispatch_csa_free = None
         self.dispatch_csa_valid = None
         self.dispatch_cur_class = None
         self.dispatch_ibuff_fill = None
         self.dispatch_ignore = None
-        self.dispatch_macro_ins = None
         self.dispatch_mem_strt = None
         self.dispatch_parity = None
         self.dispatch_uadr = None
@@ -88,7 +166,6 @@ class Ucode():
         "dispatch_cur_class": 3,
         "dispatch_ibuff_fill": 1,
         "dispatch_ignore": 1,
-        "dispatch_macro_ins": 16,
         "dispatch_mem_strt": 2,
         "dispatch_parity": 1,
         "dispatch_uadr": 13,
@@ -157,7 +234,7 @@ class Ucode():
             yield i, getattr(self, i)
 
     def load_dispatch_uword(self, uword):
-        ''' Machine Generated file, see r1k_ucode_codegen.p'''
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
 
         self.dispatch_uword = bytes(uword)
 
@@ -215,7 +292,7 @@ class Ucode():
         assert not a & 0x1f
 
     def load_seq_uword(self, uword):
-        ''' Machine Generated file, see r1k_ucode_codegen.p'''
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
 
         self.seq_uword = bytes(uword)
 
@@ -286,7 +363,7 @@ class Ucode():
         assert not a & 0x09
 
     def load_fiu_uword(self, uword):
-        ''' Machine Generated file, see r1k_ucode_codegen.p'''
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
 
         self.fiu_uword = bytes(uword)
 
@@ -354,7 +431,7 @@ class Ucode():
         assert not a & 0x03
 
     def load_typ_uword(self, uword):
-        ''' Machine Generated file, see r1k_ucode_codegen.p'''
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
 
         self.typ_uword = bytes(uword)
 
@@ -430,7 +507,7 @@ class Ucode():
         assert not a & 0x03
 
     def load_val_uword(self, uword):
-        ''' Machine Generated file, see r1k_ucode_codegen.p'''
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
 
         self.val_uword = bytes(uword)
 
@@ -499,7 +576,7 @@ class Ucode():
         # assert not a & 0x07
 
     def load_ioc_uword(self, uword):
-        ''' Machine Generated file, see r1k_ucode_codegen.p'''
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
 
         self.ioc_uword = bytes(uword)
 
@@ -522,3 +599,645 @@ class Ucode():
         self.ioc_tvbs |= (a & 0x04)
         self.ioc_tvbs |= (a & 0x02)
         self.ioc_tvbs |= (a & 0x01)
+
+    def load_dispatch_uword_lut(self, uword):
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+        self.dispatch_uword = bytes(uword)
+        a = pack_dispatch_uword(uword)
+        self.dispatch_csa_free = a & 0x3
+        self.dispatch_csa_valid = a >> 2 & 0x7
+        self.dispatch_cur_class = a >> 5 & 0xf
+        self.dispatch_ibuff_fill = a >> 9 & 0x3
+        self.dispatch_ignore = a >> 11 & 0x3
+        self.dispatch_mem_strt = a >> 13 & 0x7
+        self.dispatch_parity = a >> 16 & 0x3
+        self.dispatch_uadr = a >> 18 & 0x3fff
+        self.dispatch_uses_tos = a >> 32 & 0x3
+
+    def load_seq_uword_lut(self, uword):
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+        self.seq_uword = bytes(uword)
+        a = pack_seq_uword(uword)
+        self.seq_b_timing = a & 0x3
+        self.seq_br_type = a >> 2 & 0xf
+        self.seq_branch_adr = a >> 6 & 0x3fff
+        self.seq_cond_sel = a >> 20 & 0x7f
+        self.seq_en_micro = a >> 27 & 0x3
+        self.seq_int_reads = a >> 29 & 0x7
+        self.seq_latch = a >> 32 & 0x3
+        self.seq_lex_adr = a >> 34 & 0x3
+        self.seq_parity = a >> 36 & 0x3
+        self.seq_random = a >> 38 & 0x7f
+
+    def load_fiu_uword_lut(self, uword):
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+        self.fiu_uword = bytes(uword)
+        a = pack_fiu_uword(uword)
+        self.fiu_fill_mode_src = a & 0x3
+        self.fiu_len_fill_lit = a >> 2 & 0x7f
+        self.fiu_len_fill_reg_ctl = a >> 9 & 0x3
+        self.fiu_length_src = a >> 11 & 0x3
+        self.fiu_load_mdr = a >> 13 & 0x3
+        self.fiu_load_oreg = a >> 15 & 0x3
+        self.fiu_load_tar = a >> 17 & 0x3
+        self.fiu_load_var = a >> 19 & 0x3
+        self.fiu_mem_start = a >> 21 & 0x1f
+        self.fiu_offs_lit = a >> 26 & 0x7f
+        self.fiu_offset_src = a >> 33 & 0x3
+        self.fiu_op_sel = a >> 35 & 0x3
+        self.fiu_oreg_src = a >> 37 & 0x3
+        self.fiu_parity = a >> 39 & 0x3
+        self.fiu_rdata_src = a >> 41 & 0x3
+        self.fiu_tivi_src = a >> 43 & 0xf
+        self.fiu_vmux_sel = a >> 47 & 0x3
+
+    def load_typ_uword_lut(self, uword):
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+        self.typ_uword = bytes(uword)
+        a = pack_typ_uword(uword)
+        self.typ_a_adr = a & 0x3f
+        self.typ_alu_func = a >> 6 & 0x1f
+        self.typ_b_adr = a >> 11 & 0x3f
+        self.typ_c_adr = a >> 17 & 0x3f
+        self.typ_c_lit = a >> 23 & 0x3
+        self.typ_c_mux_sel = a >> 25 & 0x3
+        self.typ_c_source = a >> 27 & 0x3
+        self.typ_csa_cntl = a >> 29 & 0x7
+        self.typ_frame = a >> 32 & 0x1f
+        self.typ_mar_cntl = a >> 37 & 0xf
+        self.typ_parity = a >> 41 & 0x3
+        self.typ_priv_check = a >> 43 & 0x7
+        self.typ_rand = a >> 46 & 0xf
+
+    def load_val_uword_lut(self, uword):
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+        self.val_uword = bytes(uword)
+        a = pack_val_uword(uword)
+        self.val_a_adr = a & 0x3f
+        self.val_alu_func = a >> 6 & 0x1f
+        self.val_b_adr = a >> 11 & 0x3f
+        self.val_c_adr = a >> 17 & 0x3f
+        self.val_c_mux_sel = a >> 23 & 0x3
+        self.val_c_source = a >> 25 & 0x3
+        self.val_frame = a >> 27 & 0x1f
+        self.val_m_a_src = a >> 32 & 0x3
+        self.val_m_b_src = a >> 34 & 0x3
+        self.val_parity = a >> 36 & 0x3
+        self.val_rand = a >> 38 & 0xf
+
+    def load_ioc_uword_lut(self, uword):
+        ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+        self.ioc_uword = bytes(uword)
+        a = pack_ioc_uword(uword)
+        self.ioc_adrbs = a & 0x3
+        self.ioc_fiubs = a >> 2 & 0x3
+        self.ioc_load_wdr = a >> 4 & 0x3
+        self.ioc_parity = a >> 6 & 0x3
+        self.ioc_random = a >> 8 & 0x1f
+        self.ioc_tvbs = a >> 13 & 0xf
+
+
+def decode_dispatch_lanes(uword, rep):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+    retval = {}
+
+    a = uword[0] ^ 0x40 * rep
+    retval["dispatch_uadr"] = (a & 0x80 * rep) >> 5
+    retval["dispatch_ibuff_fill"] = (a & 0x40 * rep) >> 6
+    retval["dispatch_csa_free"] = (a & 0x20 * rep) >> 5
+    retval["dispatch_cur_class"] = (a & 0x10 * rep) >> 4
+    assert not a & 0x0f * rep
+
+    a = uword[1]
+    retval["dispatch_uadr"] |= (a & 0x80 * rep) >> 4
+    retval["dispatch_uses_tos"] = (a & 0x40 * rep) >> 6
+    retval["dispatch_csa_free"] |= (a & 0x20 * rep) >> 4
+    retval["dispatch_cur_class"] |= (a & 0x10 * rep) >> 3
+    assert not a & 0x0f * rep
+
+    a = uword[2]
+    retval["dispatch_uadr"] |= (a & 0x80 * rep) >> 2
+    retval["dispatch_parity"] = (a & 0x40 * rep) >> 6
+    retval["dispatch_csa_valid"] = (a & 0x20 * rep) >> 5
+    retval["dispatch_cur_class"] |= (a & 0x10 * rep) >> 2
+    assert not a & 0x0f * rep
+
+    a = uword[3]
+    retval["dispatch_uadr"] |= (a & 0x80 * rep) >> 1
+    retval["dispatch_uadr"] |= (a & 0x40 * rep) >> 5
+    retval["dispatch_csa_valid"] |= (a & 0x20 * rep) >> 4
+    retval["dispatch_cur_class"] |= (a & 0x10 * rep) >> 1
+    assert not a & 0x0f * rep
+
+    a = uword[4]
+    retval["dispatch_uadr"] |= (a & 0x80 * rep) << 1
+    retval["dispatch_uadr"] |= (a & 0x40 * rep) >> 2
+    retval["dispatch_csa_valid"] |= (a & 0x20 * rep) >> 3
+    retval["dispatch_mem_strt"] = (a & 0x10 * rep) >> 4
+    assert not a & 0x0f * rep
+
+    a = uword[5]
+    retval["dispatch_uadr"] |= (a & 0x80 * rep) << 2
+    retval["dispatch_uadr"] |= (a & 0x40 * rep) << 1
+    retval["dispatch_mem_strt"] |= (a & 0x10 * rep) >> 3
+    assert not a & 0x2f * rep
+
+    a = uword[6]
+    retval["dispatch_uadr"] |= (a & 0x80 * rep) << 5
+    retval["dispatch_uadr"] |= (a & 0x40 * rep) << 4
+    retval["dispatch_mem_strt"] |= (a & 0x10 * rep) >> 2
+    assert not a & 0x2f * rep
+
+    a = uword[7]
+    retval["dispatch_uadr"] |= (a & 0x80 * rep) << 6
+    retval["dispatch_uadr"] |= (a & 0x40 * rep) << 5
+    retval["dispatch_ignore"] = (a & 0x20 * rep) >> 5
+    assert not a & 0x1f * rep
+
+    return retval
+
+
+def decode_seq_lanes(uword, rep):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+    retval = {}
+
+    a = uword[0] ^ 0x40 * rep
+    retval["seq_branch_adr"] = (a & 0x80 * rep)
+    retval["seq_cond_sel"] = (a & 0x40 * rep) >> 5
+    retval["seq_latch"] = (a & 0x20 * rep) >> 5
+    retval["seq_int_reads"] = (a & 0x10 * rep) >> 4
+    retval["seq_random"] = (a & 0x04 * rep) << 1
+    assert not a & 0x0b * rep
+
+    a = uword[1] ^ 0x40 * rep
+    retval["seq_branch_adr"] |= (a & 0x80 * rep) >> 1
+    retval["seq_cond_sel"] |= (a & 0x40 * rep) >> 6
+    retval["seq_br_type"] = (a & 0x20 * rep) >> 3
+    retval["seq_int_reads"] |= (a & 0x10 * rep) >> 3
+    retval["seq_random"] |= (a & 0x04 * rep) << 2
+    assert not a & 0x0b * rep
+
+    a = uword[2]
+    retval["seq_branch_adr"] |= (a & 0x80 * rep) >> 2
+    retval["seq_branch_adr"] |= (a & 0x40 * rep) << 7
+    retval["seq_br_type"] |= (a & 0x20 * rep) >> 2
+    retval["seq_br_type"] |= (a & 0x10 * rep) >> 4
+    retval["seq_random"] |= (a & 0x04 * rep) >> 1
+    assert not a & 0x0b * rep
+
+    a = uword[3] ^ 0x20 * rep
+    retval["seq_branch_adr"] |= (a & 0x80 * rep) >> 3
+    retval["seq_branch_adr"] |= (a & 0x40 * rep) << 6
+    retval["seq_cond_sel"] |= (a & 0x20 * rep) << 1
+    retval["seq_br_type"] |= (a & 0x10 * rep) >> 3
+    retval["seq_random"] |= (a & 0x04 * rep)
+    assert not a & 0x0b * rep
+
+    a = uword[4] ^ 0x20 * rep
+    retval["seq_branch_adr"] |= (a & 0x80 * rep) >> 4
+    retval["seq_branch_adr"] |= (a & 0x40 * rep) << 5
+    retval["seq_cond_sel"] |= (a & 0x20 * rep)
+    retval["seq_en_micro"] = (a & 0x10 * rep) >> 4
+    retval["seq_random"] |= (a & 0x04 * rep) >> 2
+    assert not a & 0x0b * rep
+
+    a = uword[5] ^ 0x20 * rep
+    retval["seq_branch_adr"] |= (a & 0x80 * rep) >> 5
+    retval["seq_branch_adr"] |= (a & 0x40 * rep) << 4
+    retval["seq_cond_sel"] |= (a & 0x20 * rep) >> 3
+    retval["seq_b_timing"] = (a & 0x10 * rep) >> 4
+    retval["seq_parity"] = (a & 0x04 * rep) >> 2
+    assert not a & 0x0b * rep
+
+    a = uword[6] ^ 0x20 * rep
+    retval["seq_branch_adr"] |= (a & 0x80 * rep) >> 6
+    retval["seq_branch_adr"] |= (a & 0x40 * rep) << 3
+    retval["seq_cond_sel"] |= (a & 0x20 * rep) >> 2
+    retval["seq_b_timing"] |= (a & 0x10 * rep) >> 3
+    retval["seq_lex_adr"] = (a & 0x04 * rep) >> 2
+    retval["seq_random"] |= (a & 0x02 * rep) << 4
+    assert not a & 0x09 * rep
+
+    a = uword[7] ^ 0x20 * rep
+    retval["seq_branch_adr"] |= (a & 0x80 * rep) >> 7
+    retval["seq_branch_adr"] |= (a & 0x40 * rep) << 2
+    retval["seq_cond_sel"] |= (a & 0x20 * rep) >> 1
+    retval["seq_int_reads"] |= (a & 0x10 * rep) >> 2
+    retval["seq_lex_adr"] |= (a & 0x04 * rep) >> 1
+    retval["seq_random"] |= (a & 0x02 * rep) << 5
+    assert not a & 0x09 * rep
+
+    return retval
+
+
+def decode_fiu_lanes(uword, rep):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+    retval = {}
+
+    a = uword[0]
+    retval["fiu_len_fill_lit"] = (a & 0x80 * rep) >> 1
+    retval["fiu_len_fill_reg_ctl"] = (a & 0x40 * rep) >> 6
+    retval["fiu_load_mdr"] = (a & 0x10 * rep) >> 4
+    retval["fiu_parity"] = (a & 0x08 * rep) >> 3
+    assert not a & 0x27 * rep
+
+    a = uword[1] ^ 0x10 * rep
+    retval["fiu_offs_lit"] = (a & 0x80 * rep) >> 7
+    retval["fiu_len_fill_reg_ctl"] |= (a & 0x40 * rep) >> 5
+    retval["fiu_load_tar"] = (a & 0x10 * rep) >> 4
+    assert not a & 0x2f * rep
+
+    a = uword[2] ^ 0x10 * rep
+    retval["fiu_offs_lit"] |= (a & 0x80 * rep) >> 6
+    retval["fiu_len_fill_lit"] |= (a & 0x40 * rep) >> 6
+    retval["fiu_oreg_src"] = (a & 0x20 * rep) >> 5
+    retval["fiu_load_var"] = (a & 0x10 * rep) >> 4
+    retval["fiu_rdata_src"] = (a & 0x08 * rep) >> 3
+    assert not a & 0x07 * rep
+
+    a = uword[3] ^ 0x10 * rep
+    retval["fiu_offs_lit"] |= (a & 0x80 * rep) >> 5
+    retval["fiu_len_fill_lit"] |= (a & 0x40 * rep) >> 5
+    retval["fiu_fill_mode_src"] = (a & 0x20 * rep) >> 5
+    retval["fiu_load_oreg"] = (a & 0x10 * rep) >> 4
+    retval["fiu_mem_start"] = (a & 0x08 * rep) >> 3
+    assert not a & 0x07 * rep
+
+    a = uword[4]
+    retval["fiu_offs_lit"] |= (a & 0x80 * rep) >> 4
+    retval["fiu_len_fill_lit"] |= (a & 0x40 * rep) >> 4
+    retval["fiu_vmux_sel"] = (a & 0x20 * rep) >> 5
+    retval["fiu_tivi_src"] = (a & 0x10 * rep) >> 4
+    retval["fiu_mem_start"] |= (a & 0x08 * rep) >> 2
+    assert not a & 0x07 * rep
+
+    a = uword[5]
+    retval["fiu_offs_lit"] |= (a & 0x80 * rep) >> 3
+    retval["fiu_len_fill_lit"] |= (a & 0x40 * rep) >> 3
+    retval["fiu_vmux_sel"] |= (a & 0x20 * rep) >> 4
+    retval["fiu_tivi_src"] |= (a & 0x10 * rep) >> 3
+    retval["fiu_mem_start"] |= (a & 0x08 * rep) >> 1
+    assert not a & 0x07 * rep
+
+    a = uword[6]
+    retval["fiu_offs_lit"] |= (a & 0x80 * rep) >> 2
+    retval["fiu_len_fill_lit"] |= (a & 0x40 * rep) >> 2
+    retval["fiu_op_sel"] = (a & 0x20 * rep) >> 5
+    retval["fiu_tivi_src"] |= (a & 0x10 * rep) >> 2
+    retval["fiu_mem_start"] |= (a & 0x08 * rep)
+    retval["fiu_length_src"] = (a & 0x04 * rep) >> 2
+    assert not a & 0x03 * rep
+
+    a = uword[7]
+    retval["fiu_offs_lit"] |= (a & 0x80 * rep) >> 1
+    retval["fiu_len_fill_lit"] |= (a & 0x40 * rep) >> 1
+    retval["fiu_op_sel"] |= (a & 0x20 * rep) >> 4
+    retval["fiu_tivi_src"] |= (a & 0x10 * rep) >> 1
+    retval["fiu_mem_start"] |= (a & 0x08 * rep) << 1
+    retval["fiu_offset_src"] = (a & 0x04 * rep) >> 2
+    assert not a & 0x03 * rep
+
+    return retval
+
+
+def decode_typ_lanes(uword, rep):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+    retval = {}
+
+    a = uword[0] ^ 0xc0 * rep
+    retval["typ_b_adr"] = (a & 0x80 * rep) >> 3
+    retval["typ_frame"] = (a & 0x40 * rep) >> 5
+    retval["typ_rand"] = (a & 0x20 * rep) >> 5
+    retval["typ_priv_check"] = (a & 0x10 * rep) >> 3
+    retval["typ_c_source"] = (a & 0x08 * rep) >> 3
+    assert not a & 0x07 * rep
+
+    a = uword[1] ^ 0xc0 * rep
+    retval["typ_b_adr"] |= (a & 0x80 * rep) >> 2
+    retval["typ_frame"] |= (a & 0x40 * rep) >> 4
+    retval["typ_rand"] |= (a & 0x20 * rep) >> 4
+    retval["typ_priv_check"] |= (a & 0x10 * rep) >> 2
+    retval["typ_alu_func"] = (a & 0x08 * rep) >> 3
+    retval["typ_csa_cntl"] = (a & 0x04 * rep) >> 2
+    assert not a & 0x03 * rep
+
+    a = uword[2] ^ 0xc0 * rep
+    retval["typ_a_adr"] = (a & 0x80 * rep) >> 7
+    retval["typ_frame"] |= (a & 0x40 * rep) >> 3
+    retval["typ_rand"] |= (a & 0x20 * rep) >> 3
+    retval["typ_c_adr"] = (a & 0x10 * rep) >> 4
+    retval["typ_alu_func"] |= (a & 0x08 * rep) >> 2
+    retval["typ_csa_cntl"] |= (a & 0x04 * rep) >> 1
+    assert not a & 0x03 * rep
+
+    a = uword[3] ^ 0xc0 * rep
+    retval["typ_a_adr"] |= (a & 0x80 * rep) >> 6
+    retval["typ_frame"] |= (a & 0x40 * rep) >> 2
+    retval["typ_rand"] |= (a & 0x20 * rep) >> 2
+    retval["typ_c_adr"] |= (a & 0x10 * rep) >> 3
+    retval["typ_alu_func"] |= (a & 0x08 * rep) >> 1
+    retval["typ_csa_cntl"] |= (a & 0x04 * rep)
+    assert not a & 0x03 * rep
+
+    a = uword[4] ^ 0xc0 * rep
+    retval["typ_a_adr"] |= (a & 0x80 * rep) >> 5
+    retval["typ_b_adr"] |= (a & 0x40 * rep) >> 6
+    retval["typ_parity"] = (a & 0x20 * rep) >> 5
+    retval["typ_c_adr"] |= (a & 0x10 * rep) >> 2
+    retval["typ_alu_func"] |= (a & 0x08 * rep)
+    retval["typ_mar_cntl"] = (a & 0x04 * rep) >> 2
+    assert not a & 0x03 * rep
+
+    a = uword[5] ^ 0xe0 * rep
+    retval["typ_a_adr"] |= (a & 0x80 * rep) >> 4
+    retval["typ_b_adr"] |= (a & 0x40 * rep) >> 5
+    retval["typ_c_lit"] = (a & 0x20 * rep) >> 5
+    retval["typ_c_adr"] |= (a & 0x10 * rep) >> 1
+    retval["typ_alu_func"] |= (a & 0x08 * rep) << 1
+    retval["typ_mar_cntl"] |= (a & 0x04 * rep) >> 1
+    assert not a & 0x03 * rep
+
+    a = uword[6] ^ 0xe0 * rep
+    retval["typ_a_adr"] |= (a & 0x80 * rep) >> 3
+    retval["typ_b_adr"] |= (a & 0x40 * rep) >> 4
+    retval["typ_c_lit"] |= (a & 0x20 * rep) >> 4
+    retval["typ_c_adr"] |= (a & 0x10 * rep)
+    retval["typ_c_mux_sel"] = (a & 0x08 * rep) >> 3
+    retval["typ_mar_cntl"] |= (a & 0x04 * rep)
+    assert not a & 0x03 * rep
+
+    a = uword[7] ^ 0xc0 * rep
+    retval["typ_a_adr"] |= (a & 0x80 * rep) >> 2
+    retval["typ_b_adr"] |= (a & 0x40 * rep) >> 3
+    retval["typ_frame"] |= (a & 0x20 * rep) >> 5
+    retval["typ_c_adr"] |= (a & 0x10 * rep) << 1
+    retval["typ_priv_check"] |= (a & 0x08 * rep) >> 3
+    retval["typ_mar_cntl"] |= (a & 0x04 * rep) << 1
+    assert not a & 0x03 * rep
+
+    return retval
+
+
+def decode_val_lanes(uword, rep):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+    retval = {}
+
+    a = uword[0] ^ 0xe0 * rep
+    retval["val_b_adr"] = (a & 0x80 * rep) >> 3
+    retval["val_frame"] = (a & 0x40 * rep) >> 5
+    retval["val_rand"] = (a & 0x20 * rep) >> 5
+    retval["val_m_a_src"] = (a & 0x10 * rep) >> 4
+    retval["val_c_source"] = (a & 0x08 * rep) >> 3
+    # assert not a & 0x07 * rep
+
+    a = uword[1] ^ 0xe0 * rep
+    retval["val_b_adr"] |= (a & 0x80 * rep) >> 2
+    retval["val_frame"] |= (a & 0x40 * rep) >> 4
+    retval["val_rand"] |= (a & 0x20 * rep) >> 4
+    retval["val_m_a_src"] |= (a & 0x10 * rep) >> 3
+    retval["val_alu_func"] = (a & 0x08 * rep) >> 3
+    # assert not a & 0x07 * rep
+
+    a = uword[2] ^ 0xe0 * rep
+    retval["val_a_adr"] = (a & 0x80 * rep) >> 7
+    retval["val_frame"] |= (a & 0x40 * rep) >> 3
+    retval["val_rand"] |= (a & 0x20 * rep) >> 3
+    retval["val_c_adr"] = (a & 0x10 * rep) >> 4
+    retval["val_alu_func"] |= (a & 0x08 * rep) >> 2
+    # assert not a & 0x07 * rep
+
+    a = uword[3] ^ 0xe0 * rep
+    retval["val_a_adr"] |= (a & 0x80 * rep) >> 6
+    retval["val_frame"] |= (a & 0x40 * rep) >> 2
+    retval["val_rand"] |= (a & 0x20 * rep) >> 2
+    retval["val_c_adr"] |= (a & 0x10 * rep) >> 3
+    retval["val_alu_func"] |= (a & 0x08 * rep) >> 1
+    # assert not a & 0x07 * rep
+
+    a = uword[4] ^ 0xc0 * rep
+    retval["val_a_adr"] |= (a & 0x80 * rep) >> 5
+    retval["val_b_adr"] |= (a & 0x40 * rep) >> 6
+    retval["val_parity"] = (a & 0x20 * rep) >> 5
+    retval["val_c_adr"] |= (a & 0x10 * rep) >> 2
+    retval["val_alu_func"] |= (a & 0x08 * rep)
+    # assert not a & 0x07 * rep
+
+    a = uword[5] ^ 0xe0 * rep
+    retval["val_a_adr"] |= (a & 0x80 * rep) >> 4
+    retval["val_b_adr"] |= (a & 0x40 * rep) >> 5
+    retval["val_c_mux_sel"] = (a & 0x20 * rep) >> 5
+    retval["val_c_adr"] |= (a & 0x10 * rep) >> 1
+    retval["val_alu_func"] |= (a & 0x08 * rep) << 1
+    # assert not a & 0x07 * rep
+
+    a = uword[6] ^ 0xe0 * rep
+    retval["val_a_adr"] |= (a & 0x80 * rep) >> 3
+    retval["val_b_adr"] |= (a & 0x40 * rep) >> 4
+    retval["val_c_mux_sel"] |= (a & 0x20 * rep) >> 4
+    retval["val_c_adr"] |= (a & 0x10 * rep)
+    retval["val_m_b_src"] = (a & 0x08 * rep) >> 3
+    # assert not a & 0x07 * rep
+
+    a = uword[7] ^ 0xc0 * rep
+    retval["val_a_adr"] |= (a & 0x80 * rep) >> 2
+    retval["val_b_adr"] |= (a & 0x40 * rep) >> 3
+    retval["val_frame"] |= (a & 0x20 * rep) >> 5
+    retval["val_c_adr"] |= (a & 0x10 * rep) << 1
+    retval["val_m_b_src"] |= (a & 0x08 * rep) >> 2
+    # assert not a & 0x07 * rep
+
+    return retval
+
+
+def decode_ioc_lanes(uword, rep):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+
+    retval = {}
+
+    a = uword[0]
+    retval["ioc_parity"] = (a & 0x80 * rep) >> 7
+    retval["ioc_load_wdr"] = (a & 0x20 * rep) >> 5
+    retval["ioc_random"] = (a & 0x10 * rep)
+    retval["ioc_random"] |= (a & 0x08 * rep)
+    retval["ioc_random"] |= (a & 0x04 * rep)
+    retval["ioc_random"] |= (a & 0x02 * rep)
+    retval["ioc_random"] |= (a & 0x01 * rep)
+    # assert not a & 0x40 * rep
+
+    a = uword[1]
+    retval["ioc_adrbs"] = (a & 0x80 * rep) >> 6
+    retval["ioc_adrbs"] |= (a & 0x40 * rep) >> 6
+    retval["ioc_fiubs"] = (a & 0x20 * rep) >> 4
+    retval["ioc_fiubs"] |= (a & 0x10 * rep) >> 4
+    retval["ioc_tvbs"] = (a & 0x08 * rep)
+    retval["ioc_tvbs"] |= (a & 0x04 * rep)
+    retval["ioc_tvbs"] |= (a & 0x02 * rep)
+    retval["ioc_tvbs"] |= (a & 0x01 * rep)
+
+    return retval
+
+def lut(xor, contrib):
+    ''' Expand per-bit contributions, MSB first, to a 256 entry table '''
+    retval = []
+    for i in range(256):
+        i ^= xor
+        # OR, not add: all must-be-zero bits contribute the same error bit
+        a = 0
+        for n, j in enumerate(contrib):
+            if i & (0x80 >> n):
+                a |= j
+        retval.append(a)
+    return tuple(retval)
+
+DISPATCH_ERROR = 0x400000000
+
+DISPATCH_BITS = (
+    (0x40, (0x100000, 0x200, 0x1, 0x20, 0x400000000, 0x400000000, 0x400000000, 0x400000000)),
+    (0x00, (0x200000, 0x100000000, 0x2, 0x40, 0x400000000, 0x400000000, 0x400000000, 0x400000000)),
+    (0x00, (0x800000, 0x10000, 0x4, 0x80, 0x400000000, 0x400000000, 0x400000000, 0x400000000)),
+    (0x00, (0x1000000, 0x80000, 0x8, 0x100, 0x400000000, 0x400000000, 0x400000000, 0x400000000)),
+    (0x00, (0x4000000, 0x400000, 0x10, 0x2000, 0x400000000, 0x400000000, 0x400000000, 0x400000000)),
+    (0x00, (0x8000000, 0x2000000, 0x400000000, 0x4000, 0x400000000, 0x400000000, 0x400000000, 0x400000000)),
+    (0x00, (0x40000000, 0x10000000, 0x400000000, 0x8000, 0x400000000, 0x400000000, 0x400000000, 0x400000000)),
+    (0x00, (0x80000000, 0x20000000, 0x800, 0x400000000, 0x400000000, 0x400000000, 0x400000000, 0x400000000)),
+)
+
+DISPATCH_LUT = None
+
+def pack_dispatch_uword(uword):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+    global DISPATCH_LUT
+    tbl = DISPATCH_LUT
+    if tbl is None:
+        tbl = DISPATCH_LUT = tuple(lut(*i) for i in DISPATCH_BITS)
+    a = tbl[0][uword[0]] | tbl[1][uword[1]] | tbl[2][uword[2]] | tbl[3][uword[3]] | tbl[4][uword[4]] | tbl[5][uword[5]] | tbl[6][uword[6]] | tbl[7][uword[7]]
+    assert not a & DISPATCH_ERROR
+    return a
+
+SEQ_ERROR = 0x200000000000
+
+SEQ_BITS = (
+    (0x40, (0x2000, 0x200000, 0x100000000, 0x20000000, 0x200000000000, 0x20000000000, 0x200000000000, 0x200000000000)),
+    (0x40, (0x1000, 0x100000, 0x10, 0x40000000, 0x200000000000, 0x40000000000, 0x200000000000, 0x200000000000)),
+    (0x00, (0x800, 0x80000, 0x20, 0x4, 0x200000000000, 0x8000000000, 0x200000000000, 0x200000000000)),
+    (0x20, (0x400, 0x40000, 0x4000000, 0x8, 0x200000000000, 0x10000000000, 0x200000000000, 0x200000000000)),
+    (0x20, (0x200, 0x20000, 0x2000000, 0x8000000, 0x200000000000, 0x4000000000, 0x200000000000, 0x200000000000)),
+    (0x20, (0x100, 0x10000, 0x400000, 0x1, 0x200000000000, 0x1000000000, 0x200000000000, 0x200000000000)),
+    (0x20, (0x80, 0x8000, 0x800000, 0x2, 0x200000000000, 0x400000000, 0x80000000000, 0x200000000000)),
+    (0x20, (0x40, 0x4000, 0x1000000, 0x80000000, 0x200000000000, 0x800000000, 0x100000000000, 0x200000000000)),
+)
+
+SEQ_LUT = None
+
+def pack_seq_uword(uword):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+    global SEQ_LUT
+    tbl = SEQ_LUT
+    if tbl is None:
+        tbl = SEQ_LUT = tuple(lut(*i) for i in SEQ_BITS)
+    a = tbl[0][uword[0]] | tbl[1][uword[1]] | tbl[2][uword[2]] | tbl[3][uword[3]] | tbl[4][uword[4]] | tbl[5][uword[5]] | tbl[6][uword[6]] | tbl[7][uword[7]]
+    assert not a & SEQ_ERROR
+    return a
+
+FIU_ERROR = 0x2000000000000
+
+FIU_BITS = (
+    (0x00, (0x100, 0x200, 0x2000000000000, 0x2000, 0x8000000000, 0x2000000000000, 0x2000000000000, 0x2000000000000)),
+    (0x10, (0x4000000, 0x400, 0x2000000000000, 0x20000, 0x2000000000000, 0x2000000000000, 0x2000000000000, 0x2000000000000)),
+    (0x10, (0x8000000, 0x4, 0x2000000000, 0x80000, 0x20000000000, 0x2000000000000, 0x2000000000000, 0x2000000000000)),
+    (0x10, (0x10000000, 0x8, 0x1, 0x8000, 0x200000, 0x2000000000000, 0x2000000000000, 0x2000000000000)),
+    (0x00, (0x20000000, 0x10, 0x800000000000, 0x80000000000, 0x400000, 0x2000000000000, 0x2000000000000, 0x2000000000000)),
+    (0x00, (0x40000000, 0x20, 0x1000000000000, 0x100000000000, 0x800000, 0x2000000000000, 0x2000000000000, 0x2000000000000)),
+    (0x00, (0x80000000, 0x40, 0x800000000, 0x200000000000, 0x1000000, 0x800, 0x2000000000000, 0x2000000000000)),
+    (0x00, (0x100000000, 0x80, 0x1000000000, 0x400000000000, 0x2000000, 0x200000000, 0x2000000000000, 0x2000000000000)),
+)
+
+FIU_LUT = None
+
+def pack_fiu_uword(uword):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+    global FIU_LUT
+    tbl = FIU_LUT
+    if tbl is None:
+        tbl = FIU_LUT = tuple(lut(*i) for i in FIU_BITS)
+    a = tbl[0][uword[0]] | tbl[1][uword[1]] | tbl[2][uword[2]] | tbl[3][uword[3]] | tbl[4][uword[4]] | tbl[5][uword[5]] | tbl[6][uword[6]] | tbl[7][uword[7]]
+    assert not a & FIU_ERROR
+    return a
+
+TYP_ERROR = 0x4000000000000
+
+TYP_BITS = (
+    (0xc0, (0x8000, 0x200000000, 0x400000000000, 0x100000000000, 0x8000000, 0x4000000000000, 0x4000000000000, 0x4000000000000)),
+    (0xc0, (0x10000, 0x400000000, 0x800000000000, 0x200000000000, 0x40, 0x20000000, 0x4000000000000, 0x4000000000000)),
+    (0xc0, (0x1, 0x800000000, 0x1000000000000, 0x20000, 0x80, 0x40000000, 0x4000000000000, 0x4000000000000)),
+    (0xc0, (0x2, 0x1000000000, 0x2000000000000, 0x40000, 0x100, 0x80000000, 0x4000000000000, 0x4000000000000)),
+    (0xc0, (0x4, 0x800, 0x20000000000, 0x80000, 0x200, 0x2000000000, 0x4000000000000, 0x4000000000000)),
+    (0xe0, (0x8, 0x1000, 0x800000, 0x100000, 0x400, 0x4000000000, 0x4000000000000, 0x4000000000000)),
+    (0xe0, (0x10, 0x2000, 0x1000000, 0x200000, 0x2000000, 0x8000000000, 0x4000000000000, 0x4000000000000)),
+    (0xc0, (0x20, 0x4000, 0x100000000, 0x400000, 0x80000000000, 0x10000000000, 0x4000000000000, 0x4000000000000)),
+)
+
+TYP_LUT = None
+
+def pack_typ_uword(uword):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+    global TYP_LUT
+    tbl = TYP_LUT
+    if tbl is None:
+        tbl = TYP_LUT = tuple(lut(*i) for i in TYP_BITS)
+    a = tbl[0][uword[0]] | tbl[1][uword[1]] | tbl[2][uword[2]] | tbl[3][uword[3]] | tbl[4][uword[4]] | tbl[5][uword[5]] | tbl[6][uword[6]] | tbl[7][uword[7]]
+    assert not a & TYP_ERROR
+    return a
+
+VAL_ERROR = 0x0
+
+VAL_BITS = (
+    (0xe0, (0x8000, 0x10000000, 0x4000000000, 0x100000000, 0x2000000, 0x0, 0x0, 0x0)),
+    (0xe0, (0x10000, 0x20000000, 0x8000000000, 0x200000000, 0x40, 0x0, 0x0, 0x0)),
+    (0xe0, (0x1, 0x40000000, 0x10000000000, 0x20000, 0x80, 0x0, 0x0, 0x0)),
+    (0xe0, (0x2, 0x80000000, 0x20000000000, 0x40000, 0x100, 0x0, 0x0, 0x0)),
+    (0xc0, (0x4, 0x800, 0x1000000000, 0x80000, 0x200, 0x0, 0x0, 0x0)),
+    (0xe0, (0x8, 0x1000, 0x800000, 0x100000, 0x400, 0x0, 0x0, 0x0)),
+    (0xe0, (0x10, 0x2000, 0x1000000, 0x200000, 0x400000000, 0x0, 0x0, 0x0)),
+    (0xc0, (0x20, 0x4000, 0x8000000, 0x400000, 0x800000000, 0x0, 0x0, 0x0)),
+)
+
+VAL_LUT = None
+
+def pack_val_uword(uword):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+    global VAL_LUT
+    tbl = VAL_LUT
+    if tbl is None:
+        tbl = VAL_LUT = tuple(lut(*i) for i in VAL_BITS)
+    a = tbl[0][uword[0]] | tbl[1][uword[1]] | tbl[2][uword[2]] | tbl[3][uword[3]] | tbl[4][uword[4]] | tbl[5][uword[5]] | tbl[6][uword[6]] | tbl[7][uword[7]]
+    return a
+
+IOC_ERROR = 0x0
+
+IOC_BITS = (
+    (0x00, (0x40, 0x0, 0x10, 0x1000, 0x800, 0x400, 0x200, 0x100)),
+    (0x00, (0x2, 0x1, 0x8, 0x4, 0x10000, 0x8000, 0x4000, 0x2000)),
+)
+
+IOC_LUT = None
+
+def pack_ioc_uword(uword):
+    ''' Machine Generated file, see r1k_ucode_codegen.p '''
+    global IOC_LUT
+    tbl = IOC_LUT
+    if tbl is None:
+        tbl = IOC_LUT = tuple(lut(*i) for i in IOC_BITS)
+    a = tbl[0][uword[0]] | tbl[1][uword[1]]
+    return a
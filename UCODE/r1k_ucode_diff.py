@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2012-2021 Poul-Henning Kamp <phk@phk.freebsd.dk>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL AUTHOR OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+
+'''
+   Field level differences between two microcode files
+   ===================================================
+
+   The control store of file B is aligned to file A using the dispatch
+   RAM: the words from each dispatch target in A up to the next are
+   compared with the words from the target of the same entry in B.
+
+   Each field is compared for all addresses at once, and a
+   seq_branch_adr which only moved along with the alignment does not
+   count as a difference.
+'''
+
+import argparse
+import bisect
+import sys
+
+import r1k_ucode
+
+NONZERO = set(range(1, 256))
+
+def changed(xa, xb, size):
+    ''' Bitmap of the indices where `size` byte items of `xa` and `xb` differ '''
+    x = (int.from_bytes(xa, "little") ^ int.from_bytes(xb, "little")).to_bytes(len(xa), "little")
+    bits = 0
+    for i in range(size):
+        bits |= r1k_ucode.bitmap(x[i::size], NONZERO)
+    return bits
+
+def alignment(ua, ub):
+    '''
+       Sorted (lo, hi, delta) pieces covering all addresses, word
+       `adr` of `ua` in [lo, hi) corresponds to `adr + delta` of `ub`.
+    '''
+    nadr = 1 << 14
+    ea = ua.entries["dispatch_uadr"]
+    eb = ub.entries["dispatch_uadr"]
+    deltas = {}
+    for n in range(min(len(ea), len(eb))):
+        i = deltas.setdefault(ea[n], {})
+        i[eb[n] - ea[n]] = i.get(eb[n] - ea[n], 0) + 1
+    starts = sorted(set([0] + list(deltas)))
+    retval = []
+    for lo, hi in zip(starts, starts[1:] + [nadr]):
+        votes = deltas.get(lo, {0: 1})
+        delta = max(votes, key=lambda x: (votes[x], -abs(x)))
+        if lo + delta < 0:
+            delta = 0
+        pieces = [(lo, hi, delta)]
+        if hi + delta > nadr:
+            # The words pushed off the end are compared unmoved
+            pieces = [(lo, nadr - delta, delta), (nadr - delta, hi, 0)]
+        for piece in pieces:
+            if piece[0] == piece[1]:
+                continue
+            if retval and retval[-1][2] == piece[2]:
+                retval[-1] = (retval[-1][0], piece[1], piece[2])
+            else:
+                retval.append(piece)
+    return retval
+
+def aligned(column, pieces):
+    ''' The bytes of `column` of B, rearranged to the addresses of A '''
+    octets = column.tobytes()
+    size = column.itemsize
+    return b''.join(
+        octets[(lo + delta) * size:(hi + delta) * size] for lo, hi, delta in pieces
+    )
+
+class Diff():
+    '''
+       Differences between `Ucode`s `ua` and `ub`
+
+       `fields` maps each field name to a bitmap of the addresses of
+       `ua` where it differs from the aligned address of `ub`.
+    '''
+
+    def __init__(self, ua, ub, align=True):
+        self.ua = ua
+        self.ub = ub
+        for board in r1k_ucode.BOARDS:
+            ua.decode(board)
+            ub.decode(board)
+        if align:
+            self.pieces = alignment(ua, ub)
+        else:
+            self.pieces = [(0, 1 << 14, 0)]
+        self.starts = [i[0] for i in self.pieces]
+
+        presence = {}
+        for board in r1k_ucode.BOARDS:
+            pa = bytes(ua.present[board])
+            pb = aligned(memoryview(ub.present[board]), self.pieces)
+            presence[board] = (
+                r1k_ucode.bitmap(pa, (1,)) & r1k_ucode.bitmap(pb, (1,)),
+                changed(pa, pb, 1),
+            )
+
+        self.fields = {}
+        for fld in ua.fields:
+            both, either = presence[fld.split("_", 1)[0]]
+            col = ua.column(fld)
+            bits = changed(col.tobytes(), aligned(ub.column(fld), self.pieces), col.itemsize)
+            self.fields[fld] = (bits & both) | either
+
+        branch = self.fields["seq_branch_adr"]
+        for adr in r1k_ucode.members(branch):
+            va = ua.field("seq_branch_adr", adr)
+            vb = ub.field("seq_branch_adr", self.map(adr))
+            if va is not None and vb is not None and self.map(va) == vb:
+                branch &= ~(1 << adr)
+        self.fields["seq_branch_adr"] = branch
+
+    def map(self, adr):
+        ''' The address in B aligned with `adr` in A '''
+        return adr + self.pieces[bisect.bisect_right(self.starts, adr) - 1][2]
+
+    def bitmap(self):
+        ''' Bitmap of the addresses with any difference '''
+        bits = 0
+        for i in self.fields.values():
+            bits |= i
+        return bits
+
+    def counts(self):
+        ''' Number of differing addresses per field '''
+        return {fld: bin(bits).count("1") for fld, bits in self.fields.items() if bits}
+
+    def report(self, fo=sys.stdout):
+        ''' Write the differences, explained '''
+        explain = r1k_ucode.Uins.explainer
+        for lo, hi, delta in self.pieces:
+            if delta:
+                fo.write("# 0x%04x-0x%04x moved %+d\n" % (lo, hi - 1, delta))
+        for adr in r1k_ucode.members(self.bitmap()):
+            wa = self.ua[adr]
+            wb = self.ub[self.map(adr)]
+            fo.write("%04x %04x\n" % (wa.adr, wb.adr))
+            for fld, bits in self.fields.items():
+                if bits >> adr & 1:
+                    fo.write("    " + fld.ljust(20) + " " + explain.field_text(wa, fld) + "\n")
+                    fo.write("    " + " " * 20 + " " + explain.field_text(wb, fld) + "\n")
+        fo.write("# %d words differ\n" % bin(self.bitmap()).count("1"))
+        for fld, count in sorted(self.counts().items()):
+            fo.write("#   %-24s %6d\n" % (fld, count))
+
+def main():
+    ''' ... '''
+    parser = argparse.ArgumentParser(description="Compare two R1000 microcode files")
+    parser.add_argument("--no-align", action="store_true", help="compare address by address")
+    parser.add_argument("a")
+    parser.add_argument("b")
+    args = parser.parse_args()
+    ua = r1k_ucode.Ucode(args.a, cache=True)
+    ub = r1k_ucode.Ucode(args.b, cache=True)
+    Diff(ua, ub, align=not args.no_align).report()
+
+if __name__ == "__main__":
+    main()
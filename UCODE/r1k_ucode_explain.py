@@ -30,16 +30,27 @@
     =====================================
 '''
 
+import sys
+import types
+
+import r1k_ucode_instrument as instrument
+
 class Explain():
 
     def __init__(self):
         self.uins = None
+        self.text_cache = {}
+        self.plans = {}
+        # Show the raw register file images, see register()
+        self.regfile_images = False
         for merge_cond in range(8):
             a = self.COND.get(0x00 | merge_cond)
             b = self.COND.get(0x18 | merge_cond)
             self.COND[0x58 | merge_cond] = "(" + a + ") nand (" + b + ")"
 
     def isdefault(self, uins):
+        if hasattr(uins, "ucode"):
+            return bool(uins.ucode.wordclass()[0] >> uins.adr & 1)
         for fld in uins.fields:
             if "parity" in fld:
                 continue
@@ -49,6 +60,8 @@ class Explain():
         return True
 
     def ishalt(self, uins):
+        if hasattr(uins, "ucode"):
+            return bool(uins.ucode.wordclass()[1] >> uins.adr & 1)
         for fld in uins.fields:
             if "parity" in fld:
                 continue
@@ -57,6 +70,31 @@ class Explain():
                 return False
         return True
 
+    def bitmaps(self, ucode):
+        '''
+           Bitmaps of the <default> and <halt> words of an entire
+           r1k_ucode.Ucode, with the same rules as isdefault() and
+           ishalt(), but evaluated a field at a time for all words.
+        '''
+        full = (1 << (1 << 14)) - 1
+        absent = {}
+        retval = []
+        for sig in (self.defaults, self.halt):
+            bits = full
+            for fld in ucode.fields:
+                if "parity" in fld:
+                    continue
+                board = fld.split("_", 1)[0]
+                if board not in absent:
+                    absent[board] = full & ~ucode.presence(board)
+                val = sig.get(fld)
+                if val is None:
+                    bits &= absent[board]
+                else:
+                    bits &= ucode.match(fld, (val,)) | absent[board]
+            retval.append(bits)
+        return retval
+
     early_macro_events = {
         # R1000_SCHEMATIC_SEQ.PDF p57
         0x100: "ME_STOP_MACH",
@@ -105,6 +143,76 @@ class Explain():
         # 0x1f8: "UE pullup",
     }
 
+    # Explanations which depend on other fields than their own
+    FRAMED = (
+        "typ_a_adr", "typ_b_adr", "typ_c_adr",
+        "val_a_adr", "val_b_adr", "val_c_adr",
+    )
+
+    def plan(self, uins):
+        '''
+           The compiled explain plan for the class of `uins`
+
+           An ordered list of (field, default, format, explainer) tuples,
+           parity fields left out.  Fields at most eight bits wide, whose
+           explanation only depends on their own value, get a prebuilt
+           value to text table as explainer.
+        '''
+        plan = self.plans.get(type(uins))
+        if plan is not None:
+            return plan
+        plan = []
+        for fld, top in uins.fields.items():
+            if "parity" in fld:
+                continue
+            fmt = "%0" + "%dx" % ((top + 3) // 4)
+            i = self.table(fld, top)
+            if i is not None:
+                i = i.get
+            else:
+                i = getattr(self, fld, None)
+            plan.append((fld, self.defaults.get(fld), fmt, i))
+        self.plans[type(uins)] = plan
+        return plan
+
+    def table(self, fld, top):
+        '''
+           Value to explanation table of field `fld` with top bit `top`,
+           None if it is too wide, depends on other fields or has no
+           explanations.
+        '''
+        i = getattr(self, fld, None)
+        if not i or top >= 8 or fld in self.FRAMED:
+            return None
+        return {v: i(v) for v in range(1 << (top + 1))}
+
+    def fixed_table(self, fld, top):
+        '''
+           Value to explanation table of the values of `FRAMED` field
+           `fld` whose explanation does not depend on the frame,
+           such as "GP 0x2" or "LOOP_COUNTER".
+        '''
+        i = getattr(self, fld)
+        texts = []
+        for frame in (0, 1):
+            self.uins = types.SimpleNamespace(typ_frame=frame, val_frame=frame)
+            texts.append({v: i(v) for v in range(1 << (top + 1))})
+        self.uins = None
+        return {v: txt for v, txt in texts[0].items() if texts[1][v] == txt}
+
+    def field_text(self, uins, fld):
+        ''' Hex value and explanation of field `fld` of `uins`, "-" if not loaded '''
+        v = getattr(uins, fld)
+        if v is None:
+            return "-"
+        txt = "%0*x" % ((uins.fields[fld] + 3) // 4, v)
+        i = getattr(self, fld, None)
+        if i:
+            self.uins = uins
+            txt += " " + str(i(v))
+            self.uins = None
+        return txt
+
     def decode(self, uins):
         self.uins = uins
         n = 0
@@ -114,17 +222,13 @@ class Explain():
         if self.ishalt(uins):
             yield "<halt>", "", None
             return
-        for fld, fmt in uins.fields.items():
-            if "parity" in fld:
-                continue
+        for fld, default, fmt, i in self.plan(uins):
             v = getattr(uins, fld)
-            if v is None or v == self.defaults.get(fld):
+            if v is None or v == default:
                 continue
             n += 1
-            fmt = "%0" + "%dx" % ((fmt + 3) // 4)
             if fld == "seq_branch_adr":
                 uins.dstadr = v
-            i = getattr(self, fld, None)
             if not i:
                 yield fld, fmt % v, None
             else:
@@ -133,6 +237,27 @@ class Explain():
         assert n
 
     def decode_text(self, uins):
+        '''
+           Tuple of explanation lines, sets uins.dstadr
+
+           Explanations are cached by the `explain_key` of the
+           instruction, if it has one: the uwords and the register
+           files.  Each distinct word is only explained once.
+        '''
+        instrument.count("explain_calls")
+        key = getattr(uins, "explain_key", None)
+        hit = self.text_cache.get(key)
+        if hit is None:
+            instrument.count("explain_cache_misses")
+            uins.dstadr = None
+            hit = (tuple(sys.intern(i) for i in self.decode_lines(uins)), uins.dstadr)
+            if key is not None:
+                self.text_cache[key] = hit
+        if hit[1] is not None:
+            uins.dstadr = hit[1]
+        return hit[0]
+
+    def decode_lines(self, uins):
         for name, hexval, expl in self.decode(uins):
             if name[0] == '<':
                 yield name
@@ -722,7 +847,23 @@ class Explain():
     # TYP&VAL
     #######################################################################
 
-    def typval_a_adr(self, val, frame):
+    def register(self, board, frame, offset):
+        '''
+           The register file image of register (frame:offset) of
+           `board`, if `regfile_images` is set and it is not the fill.
+
+           The images are shown as stored in the file, their bit order
+           is not decoded, so this is not the value of the register.
+        '''
+        ucode = getattr(self.uins, "ucode", None)
+        if not self.regfile_images or board is None or ucode is None:
+            return ""
+        reg = ucode.register(board, frame * 32 + offset)
+        if reg is None:
+            return ""
+        return " [regfile image 0x%016x.%08x]" % reg
+
+    def typval_a_adr(self, val, frame, board=None):
         ''' R1000_SCHEMATIC_TYP p5,  R1000_SCHEMATIC_VAL p2 '''
         if val < 0x10:
             return "GP 0x%x" % val
@@ -740,9 +881,9 @@ class Explain():
             return "LOOP_COUNTER"
         if val < 0x20:
             return "TOP - %d" % (0x20 - val)
-        return "(0x%x:0x%x)" % (frame, val - 0x20)
+        return "(0x%x:0x%x)" % (frame, val - 0x20) + self.register(board, frame, val - 0x20)
 
-    def typval_b_adr(self, val, frame):
+    def typval_b_adr(self, val, frame, board=None):
         ''' R1000_SCHEMATIC_TYP p5,  R1000_SCHEMATIC_VAL p2 '''
         if val == 0x14:
             return "BOT - 1"
@@ -752,9 +893,9 @@ class Explain():
             return "CSA/VAL_BUS"
         if val == 0x17:
             return "SPARE_0x17"
-        return self.typval_a_adr(val, frame)
+        return self.typval_a_adr(val, frame, board)
 
-    def typval_c_adr(self, val, frame):
+    def typval_c_adr(self, val, frame, board=None):
         ''' R1000_SCHEMATIC_TYP p5,  R1000_SCHEMATIC_VAL p2 '''
         ival = val ^ 0x3f
         if ival < 0x10:
@@ -777,7 +918,7 @@ class Explain():
             return "LOOP_COUNTER"
         if ival <= 0x20:
             return "TOP - 0x%x" % (0x20 - ival)
-        return "(0x%x:0x%x)" % (frame, ival - 0x20)
+        return "(0x%x:0x%x)" % (frame, ival - 0x20) + self.register(board, frame, ival - 0x20)
 
     def typval_alu_func(self, val):
         return {
@@ -828,15 +969,15 @@ class Explain():
             return "SPARE_0x15"
         if val == 0x16:
             return "SPARE_0x16"
-        return self.typval_a_adr(val, self.uins.typ_frame)
+        return self.typval_a_adr(val, self.uins.typ_frame, "typ")
 
     def typ_b_adr(self, val):
         ''' R1000_SCHEMATIC_TYP p5 '''
-        return self.typval_b_adr(val, self.uins.typ_frame)
+        return self.typval_b_adr(val, self.uins.typ_frame, "typ")
 
     def typ_c_adr(self, val):
         ''' R1000_SCHEMATIC_TYP p5 '''
-        return self.typval_c_adr(val, self.uins.typ_frame)
+        return self.typval_c_adr(val, self.uins.typ_frame, "typ")
 
     def typ_mar_cntl(self, val):
         return {
@@ -927,15 +1068,15 @@ class Explain():
             return "ZERO_COUNTER"
         if val == 0x16:
             return "PRODUCT"
-        return self.typval_a_adr(val, self.uins.val_frame)
+        return self.typval_a_adr(val, self.uins.val_frame, "val")
 
     def val_b_adr(self, val):
         ''' R1000_SCHEMATIC_VAL p2 '''
-        return self.typval_b_adr(val, self.uins.val_frame)
+        return self.typval_b_adr(val, self.uins.val_frame, "val")
 
     def val_c_adr(self, val):
         ''' R1000_SCHEMATIC_VAL p2 '''
-        return self.typval_c_adr(val, self.uins.val_frame)
+        return self.typval_c_adr(val, self.uins.val_frame, "val")
 
     def val_alu_func(self, val):
         return self.typval_alu_func(val)
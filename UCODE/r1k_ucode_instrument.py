@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2012-2021 Poul-Henning Kamp <phk@phk.freebsd.dk>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL AUTHOR OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+
+'''
+   Opt-in timing and memory instrumentation
+   ========================================
+
+   Phases are wrapped in `span(name)`, events are tallied with
+   `count(name)`.  Both cost next to nothing until `enable()` is
+   called, after which each span records its wall-clock time and the
+   peak traced memory while it ran, nested spans included.
+'''
+
+import contextlib
+import json
+import time
+import tracemalloc
+
+enabled = False
+spans = []
+counters = {}
+stack = []
+
+def enable():
+    ''' Start recording, from scratch '''
+    global enabled
+    enabled = True
+    spans.clear()
+    counters.clear()
+    stack.clear()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    ''' Stop recording '''
+    global enabled
+    enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def count(name, n=1):
+    ''' Add `n` to counter `name` '''
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+@contextlib.contextmanager
+def span(name):
+    ''' Record time and peak memory of the enclosed phase '''
+    if not enabled:
+        yield
+        return
+    # The peak is reset per span, hand the peak so far to the parent
+    current, peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+    tracemalloc.reset_peak()
+    if stack:
+        name = stack[-1]["name"] + "/" + name
+    rec = {
+        "name": name,
+        "start": current,
+        "peak": current,
+    }
+    stack.append(rec)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(rec["peak"], peak)
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        spans.append({
+            "name": rec["name"],
+            "seconds": round(seconds, 6),
+            "peak_bytes": peak - rec["start"],
+            "net_bytes": current - rec["start"],
+        })
+
+def report():
+    ''' The recorded spans, in order of completion, and counters '''
+    return {"spans": list(spans), "counters": dict(sorted(counters.items()))}
+
+def write_report(path):
+    ''' Write the report as JSON to `path` '''
+    with open(path, "w") as fo:
+        json.dump(report(), fo, indent=2)
+        fo.write("\n")
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2012-2021 Poul-Henning Kamp <phk@phk.freebsd.dk>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL AUTHOR OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+
+'''
+   Streaming microcode listing
+   ===========================
+
+   Same annotations as disass_ucode, but written one word at a time
+   straight from the decoded store, without PyReveng3 holding the
+   whole control store, and optionally only for a range of addresses:
+
+	python3 r1k_ucode_listing.py --lo 0x1e00 --hi 0x22de M207_54.M200_UCODE
+
+   Macro instructions are disassembled if macro_disass (and thus
+   PyReveng3) is available.
+
+   The <default> words and the control flow are found for the whole
+   store, so even a short range decodes all of it.  The decoded store
+   is kept in the cache, later runs map it from there.
+'''
+
+import argparse
+import importlib
+import sys
+
+import r1k_ucode
+
+try:
+    import macro_disass
+except ImportError:
+    macro_disass = None
+
+RULE = "\t;" + "-" * 70 + "\n"
+
+EVENTS = {}
+for _kind, _events in (
+    ("Early macro", r1k_ucode.Uins.explainer.early_macro_events),
+    ("Late macro", r1k_ucode.Uins.explainer.late_macro_events),
+    ("Micro", r1k_ucode.Uins.explainer.micro_events),
+):
+    for _adr, _name in _events.items():
+        EVENTS[_adr] = (_kind + " event: " + _name, _name)
+
+def annotations(ucode, adr, macro_text=None, used=True):
+    '''
+       The (block comments, labels) both this and disass_ucode put on
+       word `adr` of `ucode`
+
+       The flow and the macro instructions are only annotated on `used`
+       words, not on <default> ones.  `macro_text` is a function giving
+       the disassembly of a macro instruction, without it there are
+       only MACRO_ labels.
+    '''
+    comments = []
+    labels = []
+    if used:
+        cfg = ucode.cfg()
+        come_from = cfg.come_from(adr)
+        if come_from:
+            comments.append("come from: " + ", ".join("0x%04x" % i for i in come_from))
+        if cfg.no_entry(adr):
+            comments.append("<no static entry>")
+        seen = set()
+        for i in ucode.macros(adr):
+            if macro_text is not None:
+                x = macro_text(i)
+                if "QQ" in x:
+                    continue
+                if x not in seen:
+                    comments.append("0x%04x " % i + x)
+                    seen.add(x)
+            labels.append("MACRO_%04x" % i)
+    if adr == 0x100:
+        comments += ["Defaults not shown:", "==================="]
+        comments += [" " * 4 + i for i in r1k_ucode.Uins.explainer.defaults_text()]
+        comments.append(" ")
+    if adr in EVENTS:
+        comments.append(EVENTS[adr][0])
+        labels.append(EVENTS[adr][1])
+    return comments, labels
+
+class Annotations():
+    '''
+       Labels and block comments by address
+
+       Stands in for the PyReveng3 memory a `Details` module
+       annotates, as `cx.m`.
+    '''
+
+    def __init__(self, lo, hi):
+        self.lo = lo
+        self.hi = hi
+        self.labels = {}
+        self.comments = {}
+
+    def set_label(self, adr, txt):
+        i = self.labels.setdefault(adr, [])
+        if txt not in i:
+            i.append(txt)
+
+    def get_labels(self, adr):
+        return self.labels.get(adr, [])
+
+    def set_block_comment(self, adr, txt):
+        self.comments.setdefault(adr, []).append(txt)
+
+class Listing():
+    ''' Write the listing of a `r1k_ucode.Ucode` '''
+
+    def __init__(self, ucode):
+        self.ucode = ucode
+        self.m = Annotations(0x100, 1 << 14)
+        self.explain = r1k_ucode.Uins.explainer
+        self.macro_text = None
+        if macro_disass is not None:
+            self.macro_text = macro_disass.disassemble
+
+        detail_module = "details_" + ucode.hash[:6]
+        try:
+            details = importlib.import_module(detail_module)
+            details.Details(self)
+        except ModuleNotFoundError:
+            self.m.set_block_comment(self.m.lo, "  no " + detail_module)
+
+    def annotations(self, adr):
+        ''' All (block comments, labels) of `adr`, see annotations() '''
+        used = self.ucode.occupancy().kind(adr) != r1k_ucode.Occupancy.DEFAULT
+        comments, labels = annotations(self.ucode, adr, self.macro_text, used)
+        retval = list(self.m.get_labels(adr))
+        retval += [i for i in labels if i not in retval]
+        return self.m.comments.get(adr, []) + comments, retval
+
+    def word(self, adr, default=None):
+        ''' The listing of the word at `adr` '''
+        retval = []
+        txt, labels = self.annotations(adr)
+        if default:
+            txt.insert(0, default)
+        if txt:
+            retval.append(RULE)
+            retval += ["\t; " + i + "\n" for i in txt]
+            retval.append(RULE)
+        retval += [i + ":\n" for i in labels]
+        uins = self.ucode[adr]
+        lines = list(self.explain.decode_text(uins))
+        if uins.dstadr is not None:
+            lines += ["==> " + str(x) for x in self.annotations(uins.dstadr)[1]]
+        retval.append("%04x\t" % adr + "\n\t".join(lines) + "\n")
+        return "".join(retval)
+
+    def write(self, fo, lo=0x100, hi=None):
+        ''' Write the listing of [lo, hi) to `fo`, a word at a time '''
+        occ = self.ucode.occupancy()
+        if hi is None:
+            hi = occ.end()
+        for rlo, rhi, kind in occ:
+            rlo = max(rlo, lo)
+            rhi = min(rhi, hi)
+            if rlo >= rhi:
+                continue
+            if kind != occ.DEFAULT or rhi - rlo == 1:
+                for adr in range(rlo, rhi):
+                    fo.write(self.word(adr))
+                continue
+            default = "0x%04x-0x%04x <default>" % (rlo, rhi - 1)
+            fo.write(self.word(rlo, default))
+            for adr in range(rlo + 1, rhi):
+                if any(self.annotations(adr)):
+                    fo.write(self.word(adr))
+
+def main():
+    ''' ... '''
+    parser = argparse.ArgumentParser(description="List R1000 microcode")
+    parser.add_argument("--lo", type=lambda x: int(x, 0), default=0x100, help="first address")
+    parser.add_argument("--hi", type=lambda x: int(x, 0), help="one past the last address")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("source")
+    args = parser.parse_args()
+    listing = Listing(r1k_ucode.Ucode(args.source, cache=True))
+    if args.output:
+        with open(args.output, "w") as fo:
+            listing.write(fo, args.lo, args.hi)
+    else:
+        listing.write(sys.stdout, args.lo, args.hi)
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,42 @@
 '''
    Take a .M200_UCODE file apart
    =============================
+
+   With `mapped=True` the file is memory-mapped rather than read, and
+   the control store can be accessed column-wise through the `*_columns()`
+   methods, which return one strided view per uword byte, without
+   slicing out the individual 32 byte records.
 '''
 
+import array
 import hashlib
+import mmap
+import struct
+
+CONTROL_STORE = 0xa400
 
 class R1kM200UcodeFile():
 
     ''' A Rational 1000 .M200_UCODE file '''
 
-    def __init__(self, source="FPTEST.M200_UCODE"):
-        self.ucode = open(source, "rb").read()
-        self.timestamp = self.ucode[0x08:0x30].rstrip(b'\x00').decode("ascii")
-        self.ident = self.ucode[0x78:0xb0].rstrip(b'\x00').decode("ascii")
+    def __init__(self, source="FPTEST.M200_UCODE", mapped=False):
+        if mapped:
+            with open(source, "rb") as fi:
+                self.ucode = memoryview(
+                    mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+                )
+        else:
+            self.ucode = open(source, "rb").read()
+        self.timestamp = bytes(self.ucode[0x08:0x30]).rstrip(b'\x00').decode("ascii")
+        self.ident = bytes(self.ucode[0x78:0xb0]).rstrip(b'\x00').decode("ascii")
         self.hash = hashlib.sha256(self.ucode).hexdigest()
 
     def __len__(self):
-        return (len(self.ucode) - 0xa400) // 32
+        return (len(self.ucode) - CONTROL_STORE) // 32
+
+    def record(self, n):
+        ''' The 32 byte control store record of word `n` '''
+        return self.ucode[CONTROL_STORE + 32 * n:CONTROL_STORE + 32 * n + 32]
 
     def dispatch_ram_low(self):
         ''' LOAD_DISPATCH_RAMS_200.SEQ '''
@@ -37,11 +57,31 @@ class R1kM200UcodeFile():
     def val_regfile(self):
         ''' LOAD_REGISTER_FILE_200.VAL '''
         for a in range(0x400, 0x6400, 24):
-            yield self.ucode[a+16:a+24] + self.ucode[a+12:a+16]
+            yield bytes(self.ucode[a+16:a+24]) + bytes(self.ucode[a+12:a+16])
+
+    def regfiles(self):
+        '''
+           LOAD_REGISTER_FILE_200.TYP and .VAL, in one pass
+
+           Returns {board: (values, checks)}, 64 bit values and the 32
+           bits stored with them, indexed by register number, both as
+           they are stored in the file.
+        '''
+        retval = {}
+        for board in ("typ", "val"):
+            retval[board] = (array.array("Q"), array.array("L"))
+        typ_v, typ_c = retval["typ"]
+        val_v, val_c = retval["val"]
+        for tv, tc, vc, vv in struct.iter_unpack(">QLLQ", self.ucode[0x400:0x6400]):
+            typ_v.append(tv)
+            typ_c.append(tc)
+            val_v.append(vv)
+            val_c.append(vc)
+        return retval
 
     def ioc_ucode(self):
         ''' LOAD_CONTROL_STORE_200.IOC '''
-        for a in range(0xa400, len(self.ucode), 32):
+        for a in range(CONTROL_STORE, len(self.ucode), 32):
             i = 0
             for c in self.ucode[a+16:a+16+8]:
                 i <<= 2
@@ -50,27 +90,70 @@ class R1kM200UcodeFile():
 
     def val_ucode(self):
         ''' LOAD_CONTROL_STORE_200.VAL '''
-        for a in range(0xa400, len(self.ucode), 32):
+        for a in range(CONTROL_STORE, len(self.ucode), 32):
             yield self.ucode[a+8:a+8+8]
 
     def seq_ucode(self):
         ''' LOAD_CONTROL_STORE_200.SEQ '''
-        for a in range(0xa400, len(self.ucode), 32):
+        for a in range(CONTROL_STORE, len(self.ucode), 32):
             yield self.ucode[a+24:a+24+8]
 
     def typ_ucode(self):
         ''' LOAD_CONTROL_STORE_200.TYP '''
-        for a in range(0xa400, len(self.ucode), 32):
+        for a in range(CONTROL_STORE, len(self.ucode), 32):
             yield self.ucode[a:a+8]
 
     def fiu_ucode(self):
         ''' LOAD_CONTROL_STORE_200.FIU '''
-        for a in range(0xa400, len(self.ucode), 32):
+        for a in range(CONTROL_STORE, len(self.ucode), 32):
             # Strip out IOC bits
             yield bytes(i & 0xfc for i in self.ucode[a+16:a+16+8])
             #yield self.ucode[a+16:a+16+8]
 
     def fiu_ucode_raw(self):
         ''' LOAD_CONTROL_STORE_200.FIU '''
-        for a in range(0xa400, len(self.ucode), 32):
+        for a in range(CONTROL_STORE, len(self.ucode), 32):
             yield self.ucode[a+16:a+16+8]
+
+    def dispatch_ram_columns(self):
+        ''' LOAD_DISPATCH_RAMS_200.SEQ, low RAM entries followed by high RAM '''
+        view = memoryview(self.ucode)
+        return [view[0x6400 + i:0xa400:8] for i in range(8)]
+
+    def columns(self, offset):
+        ''' Strided read-only views of eight uword bytes at `offset` in each record '''
+        view = memoryview(self.ucode)
+        return [view[CONTROL_STORE + offset + i::32] for i in range(8)]
+
+    def typ_columns(self):
+        ''' LOAD_CONTROL_STORE_200.TYP '''
+        return self.columns(0)
+
+    def val_columns(self):
+        ''' LOAD_CONTROL_STORE_200.VAL '''
+        return self.columns(8)
+
+    def seq_columns(self):
+        ''' LOAD_CONTROL_STORE_200.SEQ '''
+        return self.columns(24)
+
+    def fiu_columns_raw(self):
+        ''' LOAD_CONTROL_STORE_200.FIU (IOC bits included) '''
+        return self.columns(16)
+
+    def fiu_columns(self):
+        ''' LOAD_CONTROL_STORE_200.FIU, IOC bits stripped (one copy per column) '''
+        strip = bytes(i & 0xfc for i in range(256))
+        return [bytes(i).translate(strip) for i in self.fiu_columns_raw()]
+
+    def ioc_columns(self):
+        ''' LOAD_CONTROL_STORE_200.IOC, two low bits of each FIU byte '''
+        tbls = [bytes((i & 3) << s for i in range(256)) for s in (6, 4, 2, 0)]
+        raw = self.fiu_columns_raw()
+        retval = []
+        for half in (raw[:4], raw[4:]):
+            i = 0
+            for col, tbl in zip(half, tbls):
+                i |= int.from_bytes(bytes(col).translate(tbl), "little")
+            retval.append(i.to_bytes(len(raw[0]), "little"))
+        return retval
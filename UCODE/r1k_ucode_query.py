@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2012-2021 Poul-Henning Kamp <phk@phk.freebsd.dk>
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR AND CONTRIBUTORS ``AS IS'' AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED.  IN NO EVENT SHALL AUTHOR OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS
+# OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION)
+# HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY
+# OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF
+# SUCH DAMAGE.
+#
+
+'''
+   Find micro instructions by their fields
+   =======================================
+
+   A query is a list of terms, all of which must hold:
+
+	field=value[,value...]	field is one of the values
+	field!=value[,value...]	field is loaded and none of the values
+	field~regex		explanation of field matches regex
+	field!~regex		field is loaded and explanation does not match
+	field			field is loaded and not the default value
+
+   Values are numbers (int() syntax, so hex needs 0x), "default"
+   or the symbolic names from r1k_ucode_explain, compared without
+   regard to case, '-' and '_'.
+
+   Of the register address fields, only the names which do not
+   depend on the frame, such as "GP 0x2" or "LOOP_COUNTER", can be
+   used.
+
+   Field names are those in Ucode.fields, the board prefix can be
+   left out if the rest is unique.
+
+   Each term is evaluated as a bitmap over all addresses, see
+   Ucode.match().
+
+	python3 r1k_ucode_query.py M207_54.M200_UCODE \
+	    fiu_mem_start=start-rd 'seq_br_type~dispatch'
+'''
+
+import argparse
+import re
+
+import r1k_ucode
+
+TERM = re.compile(r'^(\w+)\s*(?:(!=|=|!~|~)\s*(.*))?$')
+
+def canonical(txt):
+    ''' Symbolic value normalized for comparison '''
+    return txt.lower().replace("-", "_").replace(" ", "_")
+
+class Query():
+    ''' Queries against one `r1k_ucode.Ucode` '''
+
+    def __init__(self, ucode):
+        self.ucode = ucode
+        self.explainer = r1k_ucode.Uins.explainer
+        self.tables = {}
+
+    def field(self, name):
+        ''' Resolve a possibly abbreviated field name '''
+        if name in self.ucode.fields:
+            return name
+        cands = [i for i in self.ucode.fields if i.endswith("_" + name)]
+        if len(cands) != 1:
+            raise ValueError("Field '%s' matches %s" % (name, cands or "nothing"))
+        return cands[0]
+
+    def table(self, fld):
+        ''' Value to explanation table of `fld` '''
+        tbl = self.tables.get(fld)
+        if tbl is None:
+            if fld in self.explainer.FRAMED:
+                tbl = self.explainer.fixed_table(fld, self.ucode.fields[fld])
+            else:
+                tbl = self.explainer.table(fld, self.ucode.fields[fld])
+            if tbl is None:
+                raise ValueError("Field '%s' has no symbolic values" % fld)
+            self.tables[fld] = tbl
+        return tbl
+
+    def values(self, fld, txt):
+        ''' The values of `fld` listed in `txt` '''
+        retval = set()
+        for word in txt.split(","):
+            word = word.strip()
+            if word == "default":
+                if fld not in self.explainer.defaults:
+                    raise ValueError("Field '%s' has no default" % fld)
+                retval.add(self.explainer.defaults[fld])
+                continue
+            try:
+                retval.add(int(word, 0))
+                continue
+            except ValueError:
+                pass
+            hits = [v for v, expl in self.table(fld).items() if canonical(str(expl)) == canonical(word)]
+            if not hits:
+                raise ValueError("Field '%s' has no value '%s'" % (fld, word))
+            retval.update(hits)
+        return retval
+
+    def term(self, txt):
+        ''' Bitmap of the addresses where term `txt` holds '''
+        m = TERM.match(txt.strip())
+        if not m:
+            raise ValueError("Bad term '%s'" % txt)
+        fld = self.field(m.group(1))
+        oper = m.group(2)
+        present = self.ucode.presence(fld.split("_", 1)[0])
+        if oper is None:
+            default = self.explainer.defaults.get(fld)
+            if default is None:
+                return present
+            return present & ~self.ucode.match(fld, (default,))
+        if oper[-1] == "~":
+            try:
+                pat = re.compile(m.group(3), re.IGNORECASE)
+            except re.error as err:
+                raise ValueError("Bad regex '%s': %s" % (m.group(3), err))
+            vals = set(v for v, expl in self.table(fld).items() if pat.search(str(expl)))
+        else:
+            vals = self.values(fld, m.group(3))
+        bits = self.ucode.match(fld, vals)
+        if oper[0] == "!":
+            bits = present & ~bits
+        return bits
+
+    def bitmap(self, *terms):
+        ''' Bitmap of the addresses where all of `terms` hold '''
+        bits = (1 << (1 << 14)) - 1
+        for txt in terms:
+            bits &= self.term(txt)
+        return bits
+
+    def __call__(self, *terms):
+        ''' Sorted list of the addresses where all of `terms` hold '''
+        return r1k_ucode.members(self.bitmap(*terms))
+
+def main():
+    ''' ... '''
+    parser = argparse.ArgumentParser(
+        description="Find R1000 micro instructions by their fields",
+        epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("-x", "--explain", action="store_true", help="explain the words found")
+    parser.add_argument("source")
+    parser.add_argument("term", nargs="+")
+    args = parser.parse_args()
+    ucode = r1k_ucode.Ucode(args.source, cache=True)
+    try:
+        found = Query(ucode)(*args.term)
+    except ValueError as err:
+        parser.error(str(err))
+    for adr in found:
+        if args.explain:
+            ucode[adr].explain()
+        else:
+            print("%04x" % adr)
+
+if __name__ == "__main__":
+    main()